@@ -0,0 +1,434 @@
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from storage import load_frame
+
+# Micro-benchmarks for the pipeline hot paths, run from src/:
+#   python benchmarks.py                # all
+#   python benchmarks.py risk_engine    # one
+#   python benchmarks.py scale [--save-baseline | --compare] [scales...]
+# The scale suite needs no network or saved data: it builds the panel from synthetic.py series
+# for 1, 100 and 10,000 countries (multiples of the current dataset) and can check the
+# results against a saved baseline, exiting non-zero on a regression.
+MONTHLY_PATH = "../data/processed/macro_us_monthly.csv"
+INDEX_PATH = "../data/processed/macro_us_with_index.csv"
+
+SCALES = [int(s) for s in os.getenv("BENCH_SCALES", "1,100,10000").split(",")]
+SCALE_SERIES = int(os.getenv("BENCH_SERIES", "4"))             # indicators per country
+SCALE_YEARS = int(os.getenv("BENCH_YEARS", "64"))
+SCALE_FREQUENCY = os.getenv("BENCH_FREQUENCY", "mixed")         # mixed | daily | monthly
+SCALE_SEED = int(os.getenv("BENCH_SEED", "0"))
+SCALE_MEMORY_MB = int(os.getenv("BENCH_MEMORY_MB", "4096"))     # address-space cap per scale
+BASELINE_PATH = os.getenv("BENCH_BASELINE_PATH", "../data/benchmarks/baseline.json")
+TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.25"))          # allowed slowdown / memory growth
+PEAK_NOISE_MB = 1.0
+# Each stage is timed until it has MIN_REPEATS runs and MIN_STAGE_SECONDS of them (or
+# MAX_STAGE_SECONDS, for large inputs); the median run and the spread (interquartile range)
+# are kept. A slowdown is only flagged once it also costs more than MIN_FLAG_SECONDS and the
+# spread of both measurements, so jitter on sub-second stages is not a regression.
+MIN_REPEATS = int(os.getenv("BENCH_MIN_REPEATS", "5"))
+MIN_STAGE_SECONDS = float(os.getenv("BENCH_MIN_STAGE_SECONDS", "2"))
+MAX_STAGE_SECONDS = float(os.getenv("BENCH_MAX_STAGE_SECONDS", "30"))
+MIN_FLAG_SECONDS = float(os.getenv("BENCH_MIN_FLAG_SECONDS", "0.05"))
+
+# CLI fast paths that must not load the data stack
+STARTUP_PATHS = {"help": ["--help"], "status": ["status"]}
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "reportlab", "matplotlib", "requests", "dotenv")
+STARTUP_BUDGET_MS = float(os.getenv("BENCH_STARTUP_BUDGET_MS", "150"))  # on top of interpreter start
+
+def best_of(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def tiled(df: pd.DataFrame, factor: int) -> pd.DataFrame:
+    # The real panel repeated `factor` times, standing in for a larger universe
+    return pd.concat([df] * factor, ignore_index=True)
+
+def bench_risk_engine(factor: int = 100) -> dict:
+    import us_risk_engine as engine
+    from risk_rules import DEFAULT_RULES, compile_rules
+
+    df = tiled(load_frame(MONTHLY_PATH), factor)
+    rules = compile_rules(DEFAULT_RULES)  # what the row-wise reference implements
+
+    def row_wise():
+        out = df.copy()
+        out[["risk_score", "alerts"]] = out.apply(engine.evaluate_risk, axis=1)
+        out["risk_level"] = out["risk_score"].apply(engine.classify_score)
+        return out
+
+    t0 = time.perf_counter()
+    expected = row_wise()
+    apply_s = time.perf_counter() - t0
+    vector_s = best_of(lambda: engine.score_risk(df, rules))
+    pd.testing.assert_frame_equal(expected, engine.score_risk(df, rules))
+    return {"rows": len(df), "apply_s": apply_s, "vectorized_s": vector_s, "speedup": apply_s / vector_s}
+
+def bench_forecast(paths: int = 200_000, horizon: int = 12) -> dict:
+    import stress_forecast
+
+    history = load_frame(INDEX_PATH).sort_values("date")["macro_stress_index"].to_numpy()
+    result = {"paths": paths, "horizon": horizon}
+    for method in stress_forecast.SIMULATORS:
+        seconds = best_of(lambda: stress_forecast.simulate(history, method, horizon, paths, workers=1))
+        result[f"{method}_paths_per_s"] = paths / seconds
+    return result
+
+def bench_api(requests: int = 4000, clients: int = 8) -> dict:
+    # Load test of serve_api: `clients` keep-alive connections sharing `requests` GETs of /latest,
+    # once as full 200 responses and once revalidating with If-None-Match (304)
+    import http.client
+    import threading
+
+    import numpy as np
+    import serve_api
+
+    server = serve_api.serve(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    def client(n, headers, out):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        for _ in range(n):
+            t0 = time.perf_counter()
+            conn.request("GET", "/latest", headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            out.append(time.perf_counter() - t0)
+        conn.close()
+
+    def run(headers):
+        out = []
+        threads = [threading.Thread(target=client, args=(requests // clients, headers, out)) for _ in range(clients)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return np.array(out) * 1000, time.perf_counter() - t0
+
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    conn.request("GET", "/latest")
+    resp = conn.getresponse()
+    resp.read()
+    etag = resp.getheader("ETag")
+    conn.close()
+
+    result = {"requests": requests, "clients": clients}
+    try:
+        for name, headers in (("full", {}), ("not_modified", {"If-None-Match": etag})):
+            ms, seconds = run(headers)
+            result[f"{name}_p50_ms"] = float(np.percentile(ms, 50))
+            result[f"{name}_p99_ms"] = float(np.percentile(ms, 99))
+            result[f"{name}_req_per_s"] = len(ms) / seconds
+    finally:
+        server.shutdown()
+        server.server_close()
+    return result
+
+def _excel_run(args) -> tuple:
+    # One writer in a fresh process, so its peak RSS is not shadowed by the other's
+    import os
+    import resource
+    import tempfile
+
+    import us_excel_report
+
+    name, factor = args
+    df = tiled(load_frame(INDEX_PATH), factor)
+    sheets = {"Overview": df.tail(1), "Full_Data": df}
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with tempfile.TemporaryDirectory() as tmp:
+        t0 = time.perf_counter()
+        us_excel_report.WRITERS[name](sheets, os.path.join(tmp, f"{name}.xlsx"))
+        seconds = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return len(df), seconds, (peak - before) / 1024
+
+def bench_excel(factor: int = 10) -> dict:
+    # Full_Data-sized report sheets through both Excel writers: time and peak memory growth
+    from concurrent.futures import ProcessPoolExecutor
+
+    import us_excel_report
+
+    result = {}
+    for name in us_excel_report.WRITERS:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            rows, seconds, peak_mb = pool.submit(_excel_run, (name, factor)).result()
+        result.update({"rows": rows, f"{name}_s": seconds, f"{name}_peak_mb": peak_mb})
+    return result
+
+def bench_pdf(entities: int = 200, workers: int = 4) -> dict:
+    # pdf_batch briefs/second for `entities` copies of the US history, each with its own chart file
+    import os
+    import shutil
+    import tempfile
+
+    import pdf_batch
+    import us_pdf_report
+
+    df = load_frame(INDEX_PATH).dropna(subset=["macro_stress_index"]).sort_values("date").reset_index(drop=True)
+    names = [f"e{i:04d}" for i in range(entities)]
+    result = {"entities": entities, "workers": workers}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            shutil.copy(us_pdf_report.CHART_PATH, f"{tmp}/{name}_stress_index_recent.png")
+        for fmt in ("png", "jpeg"):
+            for n in sorted({1, workers}):
+                t0 = time.perf_counter()
+                pdf_batch.make_briefs(dict.fromkeys(names, df), os.path.join(tmp, "out"), n, fmt, tmp)
+                result[f"{fmt}_w{n}_briefs_per_s"] = entities / (time.perf_counter() - t0)
+    return result
+
+def bench_charts(entities: int = 20, workers: int = 4) -> dict:
+    # chart_renderer: cold renders of 3 charts per entity (serial and pooled), then a warm
+    # rerun served entirely from the content-hash cache
+    import os
+    import tempfile
+
+    import chart_renderer
+    import stress_forecast
+
+    df = load_frame(INDEX_PATH).sort_values("date")
+    fc = stress_forecast.forecast_bands(df)
+    batch = {f"e{i:03d}": (df, fc) for i in range(entities)}
+    result = {"charts": 3 * entities}
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sorted({1, workers}):
+            cache = os.path.join(tmp, f"cache_{n}.json")
+            jobs = [job for e, (d, f) in batch.items()
+                    for job in chart_renderer.chart_jobs(d, f, os.path.join(tmp, f"w{n}", e), e)]
+            t0 = time.perf_counter()
+            chart_renderer.render(jobs, n, cache)
+            result[f"cold_w{n}_charts_per_s"] = len(jobs) / (time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        chart_renderer.render(jobs, workers, cache)
+        result["warm_s"] = time.perf_counter() - t0
+    return result
+
+def bench_startup(repeat: int = 5) -> dict:
+    # Guard for the CLI fast paths: each runs in a fresh interpreter and must stay within
+    # STARTUP_BUDGET_MS of a bare `python -c pass`, without importing any HEAVY_MODULES
+    import subprocess
+
+    def best_ms(args):
+        return best_of(lambda: subprocess.run([sys.executable, *args], capture_output=True), repeat) * 1000
+
+    result = {"python_ms": best_ms(["-c", "pass"])}
+    problems = []
+    for name, args in STARTUP_PATHS.items():
+        ms = result[f"{name}_ms"] = best_ms(["cli.py", *args])
+        trace = subprocess.run([sys.executable, "-X", "importtime", "cli.py", *args], capture_output=True, text=True).stderr
+        imported = {line.rsplit("|", 1)[-1].strip().split(".")[0] for line in trace.splitlines()
+                    if line.startswith("import time:")}
+        heavy = sorted(imported & set(HEAVY_MODULES))
+        if heavy:
+            problems.append(f"`cli.py {' '.join(args)}` imports {', '.join(heavy)}")
+        if ms - result["python_ms"] > STARTUP_BUDGET_MS:
+            problems.append(f"`cli.py {' '.join(args)}` takes {ms - result['python_ms']:.0f}ms over bare python "
+                            f"(budget {STARTUP_BUDGET_MS:.0f}ms)")
+    if problems:
+        raise RuntimeError("CLI startup regression: " + "; ".join(problems))
+    return result
+
+def _limit_memory(mb: int) -> None:
+    # Worker initializer: fail with MemoryError instead of waking the OOM killer
+    import resource
+
+    limit = mb * 2**20
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def scale_stages(frames: dict, names: list, frequency: str = SCALE_FREQUENCY) -> list:
+    # (stage, function) pairs for the panel build over `frames`; each function takes the
+    # previous stage's output. These are the multi-country forms of us_macro_build,
+    # us_risk_engine and us_macro_index, reusing their registries, rules and z-scores.
+    import panel
+    import synthetic
+
+    registry = synthetic.registry(names, frequency)
+    features = [n for n in names if n in panel.FEATURE_INDICATORS or n not in panel.INDICATORS]
+    return [
+        ("long", lambda _: panel.to_long(frames)),
+        ("monthly", lambda long: panel.monthly_panel(long, registry)),
+        ("features", lambda monthly: panel.add_features(monthly, features)),
+        ("risk", lambda featured: panel.score_risk(featured)),
+        ("index", lambda scored: panel.build_index(scored)),
+    ]
+
+def _scale_run(args) -> dict:
+    # One scale in a fresh process: generate, then time every stage and record its memory peak.
+    # Running out of memory ends the scale; the stages before it are kept.
+    import synthetic
+
+    scale, series, years, frequency, seed = args
+    result = {"countries": scale, "stages": {}}
+    step = "generate"
+    try:
+        t0 = time.perf_counter()
+        frames = synthetic.generate(scale, series, years, frequency, seed)
+        result.update(observations=synthetic.size(frames), generate_s=time.perf_counter() - t0)
+
+        value = None
+        for step, fn in scale_stages(frames, synthetic.indicator_names(series), frequency):
+            rows = result["observations"] if value is None else len(value)
+            runs = []
+            while sum(runs) < MIN_STAGE_SECONDS or (len(runs) < MIN_REPEATS and sum(runs) < MAX_STAGE_SECONDS):
+                t0 = time.perf_counter()
+                fn(value)
+                runs.append(time.perf_counter() - t0)
+            seconds = statistics.median(runs)
+            quartiles = statistics.quantiles(runs, n=4) if len(runs) > 1 else [seconds, seconds, seconds]
+            # Memory from one more, traced run: the stage's allocation peak, which unlike RSS
+            # does not depend on what earlier stages left to the allocator
+            tracemalloc.start()
+            try:
+                out = fn(value)
+                peak = tracemalloc.get_traced_memory()[1] / 2**20
+            finally:
+                tracemalloc.stop()
+            result["stages"][step] = {"rows": rows, "seconds": seconds, "runs": len(runs),
+                                     "spread_s": quartiles[2] - quartiles[0],
+                                     "rows_per_s": rows / seconds, "peak_mb": peak}
+            value = out
+    except MemoryError:
+        result["error"] = f"out of memory in {step}"
+    return result
+
+def bench_scale(scales=None) -> dict:
+    # The panel build on synthetic FRED-like data at several multiples of the current dataset
+    # (1 country, 4 series, 64 years): throughput and peak memory per stage and scale. Each
+    # scale runs in its own process, capped at SCALE_MEMORY_MB of address space.
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+
+    results = {}
+    for scale in scales or SCALES:
+        args = (scale, SCALE_SERIES, SCALE_YEARS, SCALE_FREQUENCY, SCALE_SEED)
+        try:
+            with ProcessPoolExecutor(max_workers=1, initializer=_limit_memory, initargs=(SCALE_MEMORY_MB,)) as pool:
+                results[f"{scale}x"] = pool.submit(_scale_run, args).result()
+        except (MemoryError, BrokenProcessPool) as e:
+            results[f"{scale}x"] = {"countries": scale, "stages": {}, "error": f"worker failed: {e!r}"}
+    return {"config": scale_config(), "results": results}
+
+def scale_config() -> dict:
+    return {"series": SCALE_SERIES, "years": SCALE_YEARS, "frequency": SCALE_FREQUENCY, "seed": SCALE_SEED,
+            "machine": f"{platform.machine()} {platform.python_implementation()} {platform.python_version()} "
+                       f"{os.cpu_count()} cpu"}
+
+def save_baseline(report: dict, path: str = BASELINE_PATH) -> str:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+def compare(report: dict, baseline: dict, tolerance: float = TOLERANCE) -> list:
+    # Regressions against a saved baseline: stages whose median throughput fell, or whose peak
+    # memory grew, by more than `tolerance` (slowdowns within MIN_FLAG_SECONDS or the timing
+    # spread, and memory changes under PEAK_NOISE_MB, are ignored)
+    regressions = []
+    for scale, current in report["results"].items():
+        base = baseline["results"].get(scale)
+        if base is None:
+            continue
+        for stage, then in base["stages"].items():
+            now = current["stages"].get(stage)
+            if now is None:
+                regressions.append(f"{scale} {stage}: {current.get('error', 'not run')} (completed in the baseline)")
+                continue
+            slower = now["seconds"] - now["rows"] / then["rows_per_s"]   # vs the baseline's rate on today's rows
+            noise = max(MIN_FLAG_SECONDS, now.get("spread_s", 0) + then.get("spread_s", 0))
+            if now["rows_per_s"] < then["rows_per_s"] * (1 - tolerance) and slower > noise:
+                regressions.append(f"{scale} {stage}: {now['rows_per_s']:,.0f} rows/s "
+                                   f"vs {then['rows_per_s']:,.0f} (-{1 - now['rows_per_s'] / then['rows_per_s']:.0%})")
+            if now["peak_mb"] > then["peak_mb"] * (1 + tolerance) + PEAK_NOISE_MB:
+                regressions.append(f"{scale} {stage}: peak {now['peak_mb']:.0f}MB vs {then['peak_mb']:.0f}MB")
+    return regressions
+
+def confirm(report: dict, baseline: dict, tolerance: float = TOLERANCE) -> list:
+    # compare(), with every flagged scale measured a second time: a stage only counts as a
+    # regression if it is slower (or bigger) in both runs, not just in one noisy window
+    flagged = [s for s, r in report["results"].items() if compare({"results": {s: r}}, baseline, tolerance)]
+    if flagged:
+        print(f"⚠ Re-measuring {', '.join(flagged)} to confirm")
+        again = bench_scale([report["results"][s]["countries"] for s in flagged])["results"]
+        for scale, rerun in again.items():
+            stages = report["results"][scale]["stages"]
+            for stage, t in rerun["stages"].items():
+                if stage in stages:
+                    first = stages[stage]
+                    stages[stage] = {**max(first, t, key=lambda r: r["rows_per_s"]),
+                                     "peak_mb": min(first["peak_mb"], t["peak_mb"])}
+                else:
+                    stages[stage] = t
+            if "error" not in rerun:
+                report["results"][scale].pop("error", None)
+    return compare(report, baseline, tolerance)
+
+def format_scale(report: dict) -> str:
+    lines = [f"{'scale':>7} {'stage':<9} {'rows':>12} {'seconds':>9} {'runs':>5} {'rows/s':>12} {'peak MB':>8}"]
+    for scale, r in report["results"].items():
+        for stage, t in r["stages"].items():
+            lines.append(f"{scale:>7} {stage:<9} {t['rows']:>12,} {t['seconds']:9.3f} {t.get('runs', 1):>5} "
+                         f"{t['rows_per_s']:>12,.0f} "
+                         f"{t['peak_mb']:8.1f}")
+        if "error" in r:
+            lines.append(f"{scale:>7} {r['error']}")
+    return "\n".join(lines)
+
+BENCHMARKS = {
+    "risk_engine": bench_risk_engine,
+    "forecast": bench_forecast,
+    "api": bench_api,
+    "excel": bench_excel,
+    "pdf": bench_pdf,
+    "charts": bench_charts,
+    "startup": bench_startup,
+}
+
+def run_scale(args: list) -> int:
+    # python benchmarks.py scale [--save-baseline | --compare] [scales...]
+    scales = [int(a) for a in args if not a.startswith("--")] or SCALES
+    report = bench_scale(scales)
+    print(f"⏱ scale ({report['config']['frequency']}, {report['config']['series']} series, "
+          f"{report['config']['years']} years)\n{format_scale(report)}")
+
+    if "--save-baseline" in args:
+        print(f"✅ Baseline saved: {save_baseline(report)}")
+    if "--compare" in args:
+        if not os.path.exists(BASELINE_PATH):
+            print(f"⚠ No baseline at {BASELINE_PATH}; run with --save-baseline first")
+            return 1
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        if {k: v for k, v in baseline["config"].items() if k != "machine"} != \
+                {k: v for k, v in report["config"].items() if k != "machine"}:
+            print(f"⚠ Baseline was recorded with a different config: {baseline['config']}")
+        elif baseline["config"]["machine"] != report["config"]["machine"]:
+            print(f"⚠ Baseline was recorded on {baseline['config']['machine']}")
+        regressions = confirm(report, baseline)
+        for r in regressions:
+            print(f"❌ Regression: {r}")
+        if regressions:
+            return 1
+        print(f"✅ No regressions beyond {TOLERANCE:.0%} of the baseline")
+    return 0
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["scale"]:
+        sys.exit(run_scale(sys.argv[2:]))
+    for name in sys.argv[1:] or list(BENCHMARKS):
+        result = BENCHMARKS[name]()
+        stats = " | ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items())
+        print(f"⏱ {name}: {stats}")
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrument
+
+# Stress index charts. A chart is a job (path, title, history label, marker, history, forecast);
+# its content hash covers everything plotted, and a chart whose hash and file are unchanged
+# since the last render is skipped. Rendering uses matplotlib's Agg canvas directly (no pyplot),
+# reusing one figure per process, and is only imported once something has to be drawn.
+REPORTS_PATH = "../reports"
+CHART_DIR = "../reports/charts"                  # per-entity charts, as read by pdf_batch
+CACHE_PATH = os.getenv("CHART_CACHE_PATH", "../reports/.chart_cache.json")
+WORKERS = int(os.getenv("CHART_WORKERS", "1"))   # >1: charts render in a process pool
+RECENT_YEARS = 15
+FIGSIZE = (10, 5)
+STYLE_VERSION = "1"                              # bump when the drawing code changes
+
+_figure = None
+
+def chart_jobs(df: pd.DataFrame, forecast_df: pd.DataFrame, prefix: str, label: str) -> list:
+    # The three index charts for one entity: default, full history and the recent zoom
+    df = df.sort_values("date")
+    cutoff = df["date"].max() - pd.DateOffset(years=RECENT_YEARS)
+    recent_df = df[df["date"] >= cutoff]
+    title = f"Macro Financial Stress Index ({label}) + Forecast"
+    return [
+        (f"{prefix}.png", title, "Historical", None, df, forecast_df),
+        (f"{prefix}_full.png", f"{title} (Full History)", "Historical", None, df, forecast_df),
+        (f"{prefix}_recent.png", f"{title} (Last {RECENT_YEARS} Years)", f"Historical (Last {RECENT_YEARS}y)", "o",
+         recent_df, forecast_df),
+    ]
+
+def job_digest(job) -> str:
+    path, title, history_label, marker, df, forecast_df = job
+    h = hashlib.sha256(repr((STYLE_VERSION, FIGSIZE, title, history_label, marker)).encode())
+    h.update(df["date"].to_numpy(dtype="datetime64[ns]").tobytes())
+    h.update(df["macro_stress_index"].to_numpy(dtype=float).tobytes())
+    for c in forecast_df.columns:
+        h.update(c.encode())
+        h.update(forecast_df[c].to_numpy(dtype="datetime64[ns]" if c == "date" else float).tobytes())
+    return h.hexdigest()
+
+def figure():
+    # One Agg figure per process, cleared between charts instead of a new pyplot figure each time
+    global _figure
+    if _figure is None:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        _figure = Figure(figsize=FIGSIZE)
+        FigureCanvasAgg(_figure)
+    _figure.clear()
+    return _figure
+
+def draw(job) -> str:
+    path, title, history_label, marker, df, forecast_df = job
+    fig = figure()
+    ax = fig.add_subplot()
+    ax.plot(df["date"], df["macro_stress_index"], label=history_label)
+    if {"q05", "q95"} <= set(forecast_df.columns):
+        ax.fill_between(forecast_df["date"], forecast_df["q05"], forecast_df["q95"],
+                        color="C1", alpha=0.15, label="Forecast 5-95%")
+    if {"q25", "q75"} <= set(forecast_df.columns):
+        ax.fill_between(forecast_df["date"], forecast_df["q25"], forecast_df["q75"],
+                        color="C1", alpha=0.3, label="Forecast 25-75%")
+    ax.plot(forecast_df["date"], forecast_df["macro_stress_index"], color="C1", linestyle="--", marker=marker,
+            label=f"Forecast ({len(forecast_df)}m)")
+    ax.legend()
+    ax.set_title(title)
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Stress Index")
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fig.savefig(path)
+    return path
+
+def _draw_many(jobs: list) -> list:
+    return [draw(j) for j in jobs]
+
+def load_cache(path: str = CACHE_PATH) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_cache(cache: dict, path: str = CACHE_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def file_stamp(path: str):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+@instrument()
+def render(jobs: list, workers: int = WORKERS, cache_path: str = CACHE_PATH) -> dict:
+    # Draw the charts whose content (or file) changed; returns {path: content hash} for all jobs
+    cache = load_cache(cache_path)
+    digests = {job[0]: job_digest(job) for job in jobs}
+    stale = [job for job in jobs
+             if not os.path.exists(job[0])
+             or cache.get(job[0]) != [digests[job[0]], *file_stamp(job[0])]]
+
+    if workers > 1 and len(stale) > 1:
+        shards = [list(s) for s in np.array_split(np.array(stale, dtype=object), min(workers, len(stale)))]
+        with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+            list(pool.map(_draw_many, shards))
+    else:
+        _draw_many(stale)
+
+    for job in stale:
+        cache[job[0]] = [digests[job[0]], *file_stamp(job[0])]
+    if stale:
+        save_cache(cache, cache_path)
+    return digests
+
+def render_index_charts(df: pd.DataFrame, forecast_df: pd.DataFrame, workers: int = WORKERS) -> dict:
+    # The US report charts (reports/macro_stress_index*.png)
+    return render(chart_jobs(df, forecast_df, f"{REPORTS_PATH}/macro_stress_index", "US"), workers)
+
+def render_entity_charts(entities: dict, workers: int = WORKERS, chart_dir: str = CHART_DIR) -> dict:
+    # entities: {entity: (index history, forecast)} -> charts/{entity}_stress_index*.png
+    jobs = [job for entity, (df, fc) in entities.items()
+            for job in chart_jobs(df, fc, f"{chart_dir}/{entity}_stress_index", entity.upper())]
+    return render(jobs, workers)
+
+if __name__ == "__main__":
+    # python chart_renderer.py          US report charts
+    # python chart_renderer.py panel    one chart set per panel country (for pdf_batch)
+    import stress_forecast
+    from storage import load_frame
+
+    t0 = time.perf_counter()
+    if sys.argv[1:] == ["panel"]:
+        import pdf_batch
+        entities = {e: (df, stress_forecast.forecast(df)) for e, df in pdf_batch.load_entities().items()}
+        charts = render_entity_charts(entities)
+    else:
+        df = load_frame("../data/processed/macro_us_with_index.csv")
+        charts = render_index_charts(df, load_frame("../data/processed/macro_us_index_forecast.csv"))
+    print(f"✅ {len(charts)} charts up to date in {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+
+# One entry point for the pipeline steps, run from src/:
+#   python cli.py status            current risk level and stress regime
+#   python cli.py fetch | build | score | index | report
+#   python cli.py run               the whole pipeline (run_pipeline.py)
+# Only the standard library is imported up front. Each step imports its module (and pandas,
+# openpyxl, reportlab, ...) when it runs, and `status` reads the summaries the store
+# materializes (macro_summary) with sqlite3 alone, so it answers without loading pandas.
+DB_PATH = os.getenv("MACRO_DB_PATH", "../data/processed/macro.db")  # sql_store.DB_PATH, not imported to stay light
+DEFAULT_COUNTRY = "us"
+
+# subcommand -> (help, modules run as scripts, in order)
+STEPS = {
+    "fetch": ("download / delta-sync the FRED series into data/raw", ["fred_multi"]),
+    "build": ("build the monthly feature dataset", ["us_macro_build"]),
+    "score": ("apply the risk rules and store the executive summaries", ["us_risk_engine", "sql_store_and_query"]),
+    "index": ("compute the stress index, its forecast and charts", ["us_macro_index"]),
+    "report": ("write the Excel report and the PDF brief", ["us_excel_report", "us_pdf_report"]),
+    "run": ("run the whole pipeline", ["run_pipeline"]),
+}
+
+STATUS_QUERY = """
+    SELECT s.country, s.date, s.risk_level, s.risk_score, s.alerts,
+           r.date, r.macro_stress_index, r.stress_level, r.macro_strategy, r.percentile
+    FROM summary_snapshot s LEFT JOIN summary_regime r ON r.country = s.country
+    WHERE s.country = ?
+"""
+STATUS_FIELDS = ["country", "date", "risk_level", "risk_score", "alerts",
+                 "index_date", "macro_stress_index", "stress_level", "macro_strategy", "percentile"]
+
+def run_step(module: str) -> None:
+    # Same as `python {module}.py`
+    import runpy
+
+    argv, sys.argv = sys.argv, [f"{module}.py"]
+    try:
+        runpy.run_module(module, run_name="__main__", alter_sys=True)
+    finally:
+        sys.argv = argv
+
+def read_status(country: str = DEFAULT_COUNTRY, path: str = DB_PATH):
+    # Latest risk snapshot and stress regime as a dict, or None before the first stored run
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+    try:
+        row = conn.execute(STATUS_QUERY, (country,)).fetchone()
+    except sqlite3.OperationalError:   # summaries not materialized yet
+        return None
+    finally:
+        conn.close()
+    return dict(zip(STATUS_FIELDS, row)) if row else None
+
+def print_status(status: dict) -> None:
+    print(f"📊 {status['country'].upper()} macro risk as of {status['date']}")
+    print(f"   Risk level:    {status['risk_level']} (score {status['risk_score']})")
+    print(f"   Alerts:        {status['alerts'] or 'none'}")
+    if status["macro_stress_index"] is not None:
+        print(f"   Stress index:  {status['macro_stress_index']:.2f} {status['stress_level']} "
+              f"({status['percentile']:.0f}th percentile, {status['index_date']})")
+        print(f"   Strategy:      {status['macro_strategy']}")
+
+def status(args) -> int:
+    result = read_status(args.country, args.db)
+    if result is None:
+        print(f"⚠ No stored results for {args.country!r} in {args.db}; run `python cli.py run` first")
+        return 1
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print_status(result)
+    return 0
+
+def step(args) -> int:
+    for module in STEPS[args.command][1]:
+        run_step(module)
+    return 0
+
+def parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="cli.py", description="Macro financial risk pipeline")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    s = sub.add_parser("status", help="current risk level and stress regime (fast, no pandas)")
+    s.add_argument("--country", default=DEFAULT_COUNTRY)
+    s.add_argument("--db", default=DB_PATH)
+    s.add_argument("--json", action="store_true", help="print one JSON object")
+    s.set_defaults(func=status)
+
+    for name, (help_text, _) in STEPS.items():
+        sub.add_parser(name, help=help_text).set_defaults(func=step)
+    return p
+
+def main(argv=None) -> int:
+    args = parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import copy
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+# Streaming counterpart of us_macro_build.add_features. Per column it keeps the last HISTORY
+# values and the running rolling-mean accumulators, so appending k months costs O(k) and
+# produces exactly the floats the batch pandas path would.
+PCT_PERIODS = {"mom_pct": 1, "yoy_pct": 12}
+ROLL_WINDOWS = {"roll3": 3, "roll6": 6}
+HISTORY = max(*PCT_PERIODS.values(), *ROLL_WINDOWS.values())
+
+class StateMismatch(ValueError):
+    # The stored state no longer matches the panel (history revised, or panel not a continuation)
+    pass
+
+class RollingMean:
+    # Replays pandas' fixed-window rolling mean accumulator (Kahan-compensated add/remove,
+    # sign counts and the run-of-equal-values guard) one value at a time.
+    FIELDS = ("seen", "nobs", "sum_x", "neg_ct", "comp_add", "comp_remove", "same", "prev")
+
+    def __init__(self, window: int, state: dict = None):
+        self.window = window
+        s = state or {}
+        self.seen = s.get("seen", 0)
+        self.nobs = s.get("nobs", 0)
+        self.sum_x = s.get("sum_x", 0.0)
+        self.neg_ct = s.get("neg_ct", 0)
+        self.comp_add = s.get("comp_add", 0.0)
+        self.comp_remove = s.get("comp_remove", 0.0)
+        self.same = s.get("same", 0)
+        self.prev = s.get("prev", math.nan)
+
+    def state(self) -> dict:
+        return {f: getattr(self, f) for f in self.FIELDS}
+
+    def _add(self, val: float) -> None:
+        if val == val:
+            self.nobs += 1
+            y = val - self.comp_add
+            t = self.sum_x + y
+            self.comp_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            self.same = self.same + 1 if val == self.prev else 1
+            self.prev = val
+
+    def _remove(self, val: float) -> None:
+        if val == val:
+            self.nobs -= 1
+            y = -val - self.comp_remove
+            t = self.sum_x + y
+            self.comp_remove = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct -= 1
+
+    def push(self, val: float, leaving: float = None) -> float:
+        # `leaving` is the value dropping out of the window (None while the window fills)
+        val = _finite_or_nan(val)
+        if self.seen == 0:
+            self.prev = val
+        elif leaving is not None:
+            self._remove(_finite_or_nan(leaving))
+        self._add(val)
+        self.seen += 1
+
+        if self.nobs >= self.window and self.nobs > 0:
+            result = self.sum_x / self.nobs
+            if self.same >= self.nobs:
+                return self.prev
+            if self.neg_ct == 0 and result < 0:
+                return 0.0
+            if self.neg_ct == self.nobs and result > 0:
+                return 0.0
+            return result
+        return math.nan
+
+def _finite_or_nan(val: float) -> float:
+    # pandas' rolling treats +/-inf as missing
+    return val if math.isfinite(val) else math.nan
+
+class ColumnState:
+    def __init__(self, history=(), rolls: dict = None):
+        self.history = [float(v) for v in history]
+        self.rolls = {name: RollingMean(w, (rolls or {}).get(name)) for name, w in ROLL_WINDOWS.items()}
+
+    def to_dict(self) -> dict:
+        return {"history": self.history, "rolls": {n: r.state() for n, r in self.rolls.items()}}
+
+    def push(self, val: float) -> dict:
+        h = self.history
+        out = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for name, p in PCT_PERIODS.items():
+                # Same float ops as (x.pct_change(p) * 100): x / x.shift(p) - 1, then * 100
+                out[name] = float((np.float64(val) / np.float64(h[-p]) - 1) * 100) if len(h) >= p else math.nan
+        for name, r in self.rolls.items():
+            out[name] = r.push(val, h[-r.window] if len(h) >= r.window else None)
+        h.append(float(val))
+        del h[:-HISTORY]
+        return out
+
+class FeatureState:
+    # Feature state for a set of columns as of `checkpoint` (the last frozen row's date).
+    # Rows after the checkpoint are replayed on every update, which lets the trailing
+    # `replay` months (e.g. a partial month's DGS10 average) be revised without a rebuild.
+    def __init__(self, cols: list, checkpoint=None, columns: dict = None):
+        self.cols = list(cols)
+        self.checkpoint = pd.Timestamp(checkpoint) if checkpoint is not None else None
+        columns = columns or {}
+        self.columns = {c: ColumnState(**columns.get(c, {})) for c in self.cols}
+
+    def to_dict(self) -> dict:
+        return {
+            "cols": self.cols,
+            "checkpoint": str(self.checkpoint.date()) if self.checkpoint is not None else None,
+            "columns": {c: s.to_dict() for c, s in self.columns.items()},
+        }
+
+    def save(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            d = json.load(f)
+        return cls(d["cols"], d["checkpoint"], d["columns"])
+
+    def pending_rows(self, base: pd.DataFrame) -> pd.DataFrame:
+        # Rows of `base` after the checkpoint, after checking the frozen tail still matches
+        if self.checkpoint is None:
+            return base.reset_index(drop=True)
+
+        frozen = base[base["date"] <= self.checkpoint]
+        if frozen.empty or frozen["date"].iloc[-1] != self.checkpoint:
+            raise StateMismatch(f"checkpoint {self.checkpoint.date()} is not in the panel")
+        for c in self.cols:
+            stored = np.array(self.columns[c].history)
+            current = frozen[c].to_numpy(dtype=float)[len(frozen) - len(stored):]
+            if len(current) != len(stored) or not np.array_equal(current, stored, equal_nan=True):
+                raise StateMismatch(f"{c} history before {self.checkpoint.date()} was revised")
+        return base[base["date"] > self.checkpoint].reset_index(drop=True)
+
+    def advance(self, rows: pd.DataFrame, replay: int = 0) -> pd.DataFrame:
+        # Features for `rows` (the rows after the checkpoint). All but the last `replay`
+        # rows are committed into the state; the rest are recomputed on the next update.
+        commit = max(0, len(rows) - replay)
+        out = {}
+        for c in self.cols:
+            state = self.columns[c]
+            committed = state if commit == len(rows) else None
+            feats = {name: np.empty(len(rows)) for name in (*PCT_PERIODS, *ROLL_WINDOWS)}
+            for i, val in enumerate(rows[c].to_numpy(dtype=float)):
+                if i == commit:
+                    committed = copy.deepcopy(state)
+                for name, v in state.push(float(val)).items():
+                    feats[name][i] = v
+            self.columns[c] = committed if committed is not None else state
+            for name in (*PCT_PERIODS, *ROLL_WINDOWS):
+                out[f"{c}_{name}"] = feats[name]
+
+        if commit > 0:
+            self.checkpoint = pd.Timestamp(rows["date"].iloc[commit - 1])
+        return pd.DataFrame(out, index=rows.index)
@@ -0,0 +1,147 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Persistent on-disk cache for FRED API responses, keyed by series_id + query params.
+# Entries younger than CACHE_TTL are served without touching the network; older ones are
+# revalidated with If-None-Match / If-Modified-Since. FRED_OFFLINE=1 serves only from here.
+CACHE_DIR = os.getenv("FRED_CACHE_DIR", "../data/cache/fred")
+CACHE_ENABLED = os.getenv("FRED_CACHE", "1").lower() not in ("0", "false", "no")
+CACHE_TTL = float(os.getenv("FRED_CACHE_TTL", str(6 * 3600)))              # seconds an entry is fresh
+CACHE_MAX_AGE = float(os.getenv("FRED_CACHE_MAX_AGE", str(30 * 24 * 3600)))  # seconds before eviction
+CACHE_MAX_MB = float(os.getenv("FRED_CACHE_MAX_MB", "256"))
+OFFLINE = os.getenv("FRED_OFFLINE", "0").lower() in ("1", "true", "yes")
+# put() keeps a running total of the cache size and only rescans the directory when it goes
+# over the cap (then evicts down to EVICT_TO of it) or EVICT_INTERVAL after the last scan
+EVICT_INTERVAL = 3600.0
+EVICT_TO = 0.9
+
+class CacheMiss(RuntimeError):
+    # Raised in offline mode when a request has never been cached
+    pass
+
+class ResponseCache:
+    def __init__(self, directory: str = CACHE_DIR, ttl: float = CACHE_TTL,
+                 max_age: float = CACHE_MAX_AGE, max_mb: float = CACHE_MAX_MB):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "offline_hits": 0, "stores": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._total = None       # bytes on disk as of the last scan, plus puts since
+        self._scanned = 0.0
+
+    def key(self, series_id: str, params: dict) -> str:
+        # The API key is a credential, not part of the request identity
+        ident = {k: str(v) for k, v in params.items() if k != "api_key"}
+        ident["series_id"] = series_id
+        return hashlib.sha256(json.dumps(ident, sort_keys=True).encode()).hexdigest()[:32]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get(self, key: str):
+        try:
+            with gzip.open(self._path(key), "rt") as f:
+                return json.load(f)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["stored_at"] < self.ttl
+
+    def put(self, key: str, payload: dict, headers=None) -> None:
+        headers = headers or {}
+        entry = {
+            "stored_at": time.time(),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "payload": payload,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, "wt") as f:
+            json.dump(entry, f)
+        size = os.path.getsize(tmp)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp, path)
+        with self._lock:
+            self.stats["stores"] += 1
+            if self._total is not None:
+                self._total += size - replaced
+            due = (self._total is None or self._total > self.max_bytes
+                   or time.time() - self._scanned > EVICT_INTERVAL)
+        if due:
+            self.evict()
+
+    def touch(self, key: str, entry: dict) -> None:
+        # 304 Not Modified: the stored body is current again
+        self.put(key, entry["payload"], {"ETag": entry["etag"], "Last-Modified": entry["last_modified"]})
+
+    def conditional_headers(self, entry: dict) -> dict:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def evict(self) -> None:
+        # Drop entries past CACHE_MAX_AGE, then the least recently stored until under the size cap
+        # (EVICT_TO of it, so the next few puts do not trigger another scan)
+        if not os.path.isdir(self.directory) or not self._evict_lock.acquire(blocking=False):
+            return   # another thread is already scanning
+        try:
+            self._evict()
+        finally:
+            self._evict_lock.release()
+
+    def _evict(self) -> None:
+        now = time.time()
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json.gz"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes if total <= self.max_bytes else self.max_bytes * EVICT_TO
+        for mtime, size, path in files:
+            if now - mtime <= self.max_age and total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.count("evictions")
+        with self._lock:
+            self._total, self._scanned = total, now
+
+    def summary(self) -> str:
+        s = self.stats
+        lookups = s["hits"] + s["misses"] + s["revalidated"] + s["offline_hits"]
+        rate = (s["hits"] + s["revalidated"] + s["offline_hits"]) / lookups * 100 if lookups else 0.0
+        return (f"hits={s['hits']} revalidated={s['revalidated']} offline={s['offline_hits']} "
+                f"misses={s['misses']} stores={s['stores']} evictions={s['evictions']} ({rate:.0f}% served from cache)")
+
+CACHE = ResponseCache()
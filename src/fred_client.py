@@ -1,31 +1,141 @@
 import os
+import random
+import threading
+import time
+
 import requests
 import pandas as pd
-from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from fred_cache import CACHE, CACHE_ENABLED, OFFLINE, CacheMiss
+from instrumentation import add as count_io, instrument
+
+# Point at a local stub (see fred_stub_server.py) with FRED_BASE_URL=http://127.0.0.1:8765/fred
+FRED_BASE_URL = os.getenv("FRED_BASE_URL", "https://api.stlouisfed.org/fred").rstrip("/")
+
+RATE_LIMIT = float(os.getenv("FRED_RATE_LIMIT", "2"))  # requests/second (FRED allows 120/min)
+MAX_RETRIES = int(os.getenv("FRED_MAX_RETRIES", "4"))
+BACKOFF_SECONDS = float(os.getenv("FRED_BACKOFF_SECONDS", "0.5"))
+POOL_SIZE = int(os.getenv("FRED_POOL_SIZE", "16"))
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class RateLimiter:
+    # Spaces request starts so at most `rate` calls/second go out, shared across threads
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+_api_key = None
+_session = None
+_session_lock = threading.Lock()
+_limiter = RateLimiter(RATE_LIMIT)
 
-load_dotenv()
+def api_key() -> str:
+    # FRED_API_KEY from the environment, else from the project's .env; read on the first
+    # request rather than at import, so commands that never call FRED skip python-dotenv
+    global _api_key
+    if _api_key is None:
+        if not os.getenv("FRED_API_KEY"):
+            from dotenv import load_dotenv
+            load_dotenv()
+        _api_key = os.getenv("FRED_API_KEY") or ""
+    if not _api_key:
+        raise RuntimeError("FRED_API_KEY Not found. Check your .env file in the root of the project.")
+    return _api_key
 
-FRED_API_KEY = os.getenv("FRED_API_KEY")
+def get_session() -> requests.Session:
+    # One pooled keep-alive session shared by every fetch in the process
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
 
-def get_fred_series(series_id):
-    url = "https://api.stlouisfed.org/fred/series/observations"
-    params = {
-        "series_id": series_id,
-        "api_key": FRED_API_KEY,
-        "file_type": "json"
-    }
+def _get_with_retry(url: str, query: dict, headers: dict) -> requests.Response:
+    # Rate-limited GET with retry + exponential backoff on connection errors and 429/5xx
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        _limiter.wait()
+        delay = BACKOFF_SECONDS * 2 ** attempt * (1 + random.random())
+        try:
+            r = session.get(url, params=query, headers=headers, timeout=30)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            if r.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                r.raise_for_status()
+                return r
+            if r.headers.get("Retry-After", "").isdigit():
+                delay = max(delay, float(r.headers["Retry-After"]))
+        time.sleep(delay)
 
-    r = requests.get(url, params=params, timeout=30)
-    r.raise_for_status()
+@instrument(rows=lambda payload: len(payload.get("observations", [])))
+def fetch_observations(series_id: str, **params) -> dict:
+    # Raw /series/observations payload, served from the response cache when possible
+    query = {"series_id": series_id, "file_type": "json", **params}
+    key = CACHE.key(series_id, query)
+    entry = CACHE.get(key) if CACHE_ENABLED or OFFLINE else None
 
-    data = r.json()["observations"]
-    df = pd.DataFrame(data)[["date", "value"]]
+    if OFFLINE:
+        if entry is None:
+            CACHE.count("misses")
+            raise CacheMiss(f"FRED_OFFLINE is set and {series_id} {params or ''} is not cached")
+        CACHE.count("offline_hits")
+        return entry["payload"]
+    if entry is not None and CACHE.is_fresh(entry):
+        CACHE.count("hits")
+        return entry["payload"]
 
+    headers = CACHE.conditional_headers(entry) if entry is not None else {}
+    r = _get_with_retry(f"{FRED_BASE_URL}/series/observations", {**query, "api_key": api_key()}, headers)
+    count_io(bytes_read=len(r.content), http_requests=1)
+
+    if r.status_code == 304 and entry is not None:
+        CACHE.count("revalidated")
+        CACHE.touch(key, entry)
+        return entry["payload"]
+
+    payload = r.json()
+    if CACHE_ENABLED:
+        CACHE.count("misses")
+        CACHE.put(key, payload, r.headers)
+    return payload
+
+def observations_to_frame(obs: list) -> pd.DataFrame:
+    df = pd.DataFrame(obs, columns=["date", "value"])
     df["date"] = pd.to_datetime(df["date"])
     df["value"] = pd.to_numeric(df["value"], errors="coerce")
-
+    df = df.dropna(subset=["value"]).sort_values("date").reset_index(drop=True)
     return df
 
+def fetch_series_info(series_id: str) -> dict:
+    # /series metadata (title, frequency, last_updated, ...): a cheap release check that is
+    # never cached, since its whole point is to notice new data
+    query = {"series_id": series_id, "file_type": "json", "api_key": api_key()}
+    r = _get_with_retry(f"{FRED_BASE_URL}/series", query, {})
+    count_io(bytes_read=len(r.content), http_requests=1)
+    return r.json()["seriess"][0]
+
+@instrument()
+def get_fred_series(series_id: str, **params) -> pd.DataFrame:
+    return observations_to_frame(fetch_observations(series_id, **params)["observations"])
+
 
 if __name__ == "__main__":
     df = get_fred_series("CPIAUCSL")
@@ -1,10 +1,23 @@
+import json
 import os
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
-from dotenv import load_dotenv
 
-load_dotenv()
-API_KEY = os.getenv("FRED_API_KEY")
+import storage
+from fred_cache import CACHE, CacheMiss
+from fred_client import fetch_observations, get_fred_series, observations_to_frame
+from instrumentation import instrument
+
+MAX_WORKERS = int(os.getenv("FRED_MAX_WORKERS", "8"))
+SYNC_MODE = os.getenv("FRED_SYNC_MODE", "incremental")  # "incremental" or "full"
+# FRED revises recent history (CPI seasonal factors reach back years), so each delta
+# re-pulls this many days before the watermark, and a full pull runs periodically.
+REVISION_LOOKBACK_DAYS = int(os.getenv("FRED_REVISION_LOOKBACK_DAYS", "400"))
+FULL_RESYNC_DAYS = int(os.getenv("FRED_FULL_RESYNC_DAYS", "30"))
+RAW_PATH = "../data/raw"
+WATERMARK_PATH = f"{RAW_PATH}/_watermarks.json"
 
 SERIES = {
     "us_cpi": "CPIAUCSL",     # CPI (monthly)
@@ -14,30 +27,155 @@ SERIES = {
 }
 
 def get_series(series_id: str) -> pd.DataFrame:
-    if not API_KEY:
-        raise RuntimeError("FRED_API_KEY Not found. Check your .env file in the root of the project.")
+    return get_fred_series(series_id)
+
+def run_pool(fn, series: dict, max_workers: int = MAX_WORKERS):
+    # Run fn(name, series_id) for every series on a bounded thread pool.
+    # Returns ({name: result}, {name: seconds}); raises after the pool drains if any series failed.
+    results, latency, errors = {}, {}, {}
+
+    def timed(name, sid):
+        t0 = time.perf_counter()
+        out = fn(name, sid)
+        return out, time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(series)))) as pool:
+        futures = {pool.submit(timed, name, sid): name for name, sid in series.items()}
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                results[name], latency[name] = fut.result()
+            except Exception as e:
+                errors[name] = e
 
-    url = "https://api.stlouisfed.org/fred/series/observations"
-    params = {"series_id": series_id, "api_key": API_KEY, "file_type": "json"}
-    r = requests.get(url, params=params, timeout=30)
-    r.raise_for_status()
+    if errors:
+        failed = ", ".join(f"{n} ({series[n]}): {e}" for n, e in errors.items())
+        raise RuntimeError(f"FRED download failed for {len(errors)} series: {failed}")
+    return results, latency
 
-    obs = r.json()["observations"]
-    df = pd.DataFrame(obs)[["date", "value"]]
-    df["date"] = pd.to_datetime(df["date"])
-    df["value"] = pd.to_numeric(df["value"], errors="coerce")
-    df = df.dropna(subset=["value"]).sort_values("date").reset_index(drop=True)
-    return df
+def fetch_all(series: dict = SERIES, max_workers: int = MAX_WORKERS):
+    # Full-history download of every series, sharing one pooled session
+    return run_pool(lambda name, sid: get_series(sid), series, max_workers)
 
 def save_raw(name: str, df: pd.DataFrame) -> None:
-    os.makedirs("../data/raw", exist_ok=True)
-    path = f"../data/raw/{name}.csv"
-    df.to_csv(path, index=False)
+    path = storage.save_frame(df, f"{RAW_PATH}/{name}.csv")
     print(f"✅ Saved {name}: {path} (rows={len(df)})")
 
+def append_raw(name: str, df: pd.DataFrame, appended: pd.DataFrame) -> None:
+    # New rows only are appended to the CSV export; the columnar copy is rewritten whole
+    csv_path = storage.path_for(f"{RAW_PATH}/{name}.csv", "csv")
+    if os.path.exists(csv_path):
+        appended.to_csv(csv_path, mode="a", header=False, index=False)
+    storage.save_frame(df, f"{RAW_PATH}/{name}.csv", export_csv=not os.path.exists(csv_path))
+    print(f"✅ Appended {name}: {csv_path} (+{len(appended)} rows)")
+
+def load_watermarks() -> dict:
+    if not os.path.exists(WATERMARK_PATH):
+        return {}
+    with open(WATERMARK_PATH) as f:
+        return json.load(f)
+
+def save_watermarks(marks: dict) -> None:
+    os.makedirs(RAW_PATH, exist_ok=True)
+    tmp = WATERMARK_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(marks, f, indent=2, sort_keys=True)
+    os.replace(tmp, WATERMARK_PATH)
+
+def read_local(path: str) -> pd.DataFrame:
+    return storage.load_frame(path)
+
+@instrument()
+def sync_series(name: str, series_id: str, mark: dict = None, mode: str = SYNC_MODE):
+    # Incremental pull: only observations from (watermark - lookback) onwards are requested,
+    # and that window replaces the local rows, so revisions and deletions inside it land too.
+    # Returns (merged df, new watermark, change summary); writes nothing.
+    path = f"{RAW_PATH}/{name}.csv"
+    today = pd.Timestamp.today().normalize()
+    full = (
+        mode == "full"
+        or not mark
+        or not mark.get("last_date")          # watermark of a series that had no data yet
+        or not storage.exists(path)
+        or today - pd.Timestamp(mark["full_sync"]) >= pd.Timedelta(days=FULL_RESYNC_DAYS)
+    )
+
+    if full:
+        try:
+            payload = fetch_observations(series_id)
+        except CacheMiss:
+            if not (mark and storage.exists(path)):
+                raise
+            return read_local(path), mark, {"mode": "offline", "new": 0, "revised": 0, "append_only": True}
+        df = observations_to_frame(payload["observations"])
+        changes = {"mode": "full", "new": len(df), "revised": 0, "append_only": False}
+        full_sync = payload.get("realtime_start", str(today.date()))
+    else:
+        local = read_local(path)
+        start = pd.Timestamp(mark["last_date"]) - pd.Timedelta(days=REVISION_LOOKBACK_DAYS)
+        try:
+            payload = fetch_observations(series_id, observation_start=str(start.date()))
+        except CacheMiss:
+            # Offline with no cached delta: the local raw store is the best we have
+            return local, mark, {"mode": "offline", "new": 0, "revised": 0, "append_only": True}
+        delta = observations_to_frame(payload["observations"])
+
+        keep = local[local["date"] < start]
+        window = local[local["date"] >= start]
+
+        both = window.merge(delta, on="date", how="outer", suffixes=("_old", "_new"), indicator=True)
+        revised = int(((both["_merge"] == "both") & (both["value_old"] != both["value_new"])).sum())
+        dropped = int((both["_merge"] == "left_only").sum())
+        # Observations that appeared inside the history (a backfilled gap) are not appends
+        backfilled = int(((both["_merge"] == "right_only") & (both["date"] <= local["date"].max())).sum())
+        new = delta[delta["date"] > local["date"].max()]
+
+        df = pd.concat([keep, delta], ignore_index=True).sort_values("date").reset_index(drop=True)
+        changes = {
+            "mode": "delta",
+            "new": len(new),
+            "revised": revised + dropped + backfilled,
+            "append_only": revised + dropped + backfilled == 0,
+            "appended": new,
+        }
+        full_sync = mark["full_sync"]
+
+    new_mark = {
+        "series_id": series_id,
+        "last_date": str(df["date"].max().date()) if len(df) else None,
+        "vintage": payload.get("realtime_start", str(today.date())),
+        "full_sync": full_sync,
+        "rows": len(df),
+    }
+    return df, new_mark, changes
+
+def sync_all(series: dict = SERIES, max_workers: int = MAX_WORKERS, mode: str = SYNC_MODE):
+    # Delta-sync every series concurrently, write the raw store, then advance the watermarks
+    marks = load_watermarks()
+    results, latency = run_pool(lambda name, sid: sync_series(name, sid, marks.get(name), mode), series, max_workers)
+
+    for name in series:
+        df, mark, changes = results[name]
+        if changes["append_only"]:
+            if changes["new"]:
+                append_raw(name, df, changes["appended"])
+            else:
+                print(f"✅ {name}: up to date (vintage {mark['vintage']})")
+        else:
+            save_raw(name, df)
+            if changes["revised"]:
+                print(f"   {name}: {changes['revised']} revised observations applied")
+        marks[name] = mark
+
+    save_watermarks(marks)
+    return {name: r[0] for name, r in results.items()}, latency
+
 if __name__ == "__main__":
-    for name, sid in SERIES.items():
-        df = get_series(sid)
-        save_raw(name, df)
+    t0 = time.perf_counter()
+    frames, latency = sync_all(SERIES)
 
-    print("\nFRED multi download DONE ✅")
+    print("\nPer-series latency:")
+    for name, secs in sorted(latency.items(), key=lambda kv: -kv[1]):
+        print(f" - {name:<12} {SERIES[name]:<10} {secs:6.2f}s")
+    print(f"\nResponse cache: {CACHE.summary()}")
+    print(f"\nFRED multi download DONE ✅ ({len(frames)} series in {time.perf_counter() - t0:.2f}s)")
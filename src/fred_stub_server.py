@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from fred_multi import SERIES
+
+# Local stand-in for the FRED observations and series (metadata) endpoints, serving
+# data/raw/*.csv. Run it, then point the clients at it:
+#   python fred_stub_server.py
+#   FRED_BASE_URL=http://127.0.0.1:8765/fred FRED_API_KEY=stub python fred_multi.py
+# Releases are simulated for scheduler.py: a series' last_updated starts at server start and
+# moves when it is released, either on request (GET /stub/release?series_id=CPIAUCSL, which
+# also re-reads its CSV) or on the stub calendar, FRED_STUB_RELEASES="CPIAUCSL@30,DGS10@45"
+# (series released that many seconds after start), served at /stub/calendar.
+HOST = os.getenv("FRED_STUB_HOST", "127.0.0.1")
+PORT = int(os.getenv("FRED_STUB_PORT", "8765"))
+LATENCY = float(os.getenv("FRED_STUB_LATENCY", "0.2"))     # seconds added to every response
+FAIL_RATE = float(os.getenv("FRED_STUB_FAIL_RATE", "0.0"))  # share of requests answered with 503
+RELEASES = os.getenv("FRED_STUB_RELEASES", "")
+RAW_PATH = "../data/raw"
+
+SERIES_FILES = {sid: name for name, sid in SERIES.items()}
+
+def load_observations(series_id: str, raw_path: str = RAW_PATH) -> list:
+    name = SERIES_FILES.get(series_id, series_id)
+    df = pd.read_csv(f"{raw_path}/{name}.csv", dtype=str)
+    today = time.strftime("%Y-%m-%d")
+    return [
+        {"realtime_start": today, "realtime_end": today, "date": d, "value": v}
+        for d, v in zip(df["date"], df["value"].fillna("."))
+    ]
+
+def parse_releases(spec: str, start: float) -> dict:
+    # "CPIAUCSL@30,DGS10@45,CPIAUCSL@90" -> {series_id: [epoch seconds, ...]}
+    schedule = {}
+    for item in filter(None, (i.strip() for i in spec.split(","))):
+        sid, _, offset = item.partition("@")
+        schedule.setdefault(sid, []).append(start + float(offset or 0))
+    return {sid: sorted(times) for sid, times in schedule.items()}
+
+def fred_time(ts: float) -> str:
+    # FRED's last_updated format, in UTC
+    return time.strftime("%Y-%m-%d %H:%M:%S+00", time.gmtime(ts))
+
+def make_handler(raw_path: str = RAW_PATH, latency: float = LATENCY, fail_rate: float = FAIL_RATE,
+                 releases: str = RELEASES):
+    cache = {}
+    started = time.time()
+    released = {}                     # series_id -> time of its latest simulated release
+    schedule = parse_releases(releases, started)
+    lock = threading.Lock()
+
+    def release(sid, ts):
+        with lock:
+            released[sid] = max(released.get(sid, started), ts)
+            cache.pop(sid, None)
+
+    def last_updated(sid):
+        # Scheduled releases take effect once their time has come
+        for ts in schedule.get(sid, []):
+            if ts <= time.time() and ts > released.get(sid, started):
+                release(sid, ts)
+        return released.get(sid, started)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            if status == 200 and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            time.sleep(latency)
+
+            if url.path == "/stub/calendar":
+                # In scheduler.py's calendar format: {series name: [UTC release times]}
+                return self.send_json(200, {
+                    SERIES_FILES.get(sid, sid): [time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t)) for t in times]
+                    for sid, times in schedule.items()
+                })
+            if url.path == "/stub/release":
+                sid = q.get("series_id", "")
+                release(sid, time.time())
+                return self.send_json(200, {"id": sid, "last_updated": fred_time(last_updated(sid))})
+            if url.path not in ("/fred/series", "/fred/series/observations"):
+                return self.send_json(404, {"error_message": f"Unknown path {url.path}"})
+            if fail_rate and random.random() < fail_rate:
+                return self.send_json(503, {"error_message": "Injected failure"})
+
+            sid = q.get("series_id", "")
+            updated = last_updated(sid)
+            try:
+                if sid not in cache:
+                    cache[sid] = load_observations(sid, raw_path)
+            except FileNotFoundError:
+                return self.send_json(400, {"error_message": f"Bad Request. Series {sid} does not exist."})
+
+            if url.path == "/fred/series":
+                obs = cache[sid]
+                return self.send_json(200, {"seriess": [{
+                    "id": sid,
+                    "observation_start": obs[0]["date"] if obs else None,
+                    "observation_end": obs[-1]["date"] if obs else None,
+                    "last_updated": fred_time(updated),
+                }]})
+
+            start = q.get("observation_start", "0000-00-00")
+            end = q.get("observation_end", "9999-12-31")
+            obs = [o for o in cache[sid] if start <= o["date"] <= end]
+            today = time.strftime("%Y-%m-%d")
+            self.send_json(200, {
+                "realtime_start": today,
+                "realtime_end": today,
+                "observation_start": start,
+                "observation_end": end,
+                "count": len(obs),
+                "observations": obs,
+            })
+
+    return Handler
+
+def serve(host: str = HOST, port: int = PORT, **kwargs) -> ThreadingHTTPServer:
+    # Returns a bound server; call serve_forever() (or run it in a thread)
+    return ThreadingHTTPServer((host, port), make_handler(**kwargs))
+
+if __name__ == "__main__":
+    server = serve()
+    print(f"✅ FRED stub serving {RAW_PATH} on http://{HOST}:{PORT}/fred (latency={LATENCY}s, fail_rate={FAIL_RATE}, releases={RELEASES or 'on request'})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,174 @@
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+# Timing spans for the pipeline's stages and hot functions. Each finished span is appended to
+# METRICS_PATH as one JSON line:
+#   {"run", "span", "parent", "start", "seconds", "rows", "bytes_read", "bytes_written",
+#    "rss_mb", "rss_peak_mb", "status", ...extra fields}
+# Spans nest per thread; a span's bytes are added to its parent when it closes, so stage spans
+# carry the I/O of everything they called. With MACRO_PROFILE=1, spans opened with
+# profile=True (the pipeline stages) also run under cProfile, and dump_profile() merges them
+# into one .prof file per run (viewable with snakeviz, flameprof or gprof2dot).
+ENABLED = os.getenv("MACRO_INSTRUMENT", "1").lower() not in ("0", "false", "no")
+METRICS_PATH = os.getenv("MACRO_METRICS_PATH", "../logs/metrics.jsonl")
+# Long-running processes (scheduler, serve_api) append forever: past this size the file is
+# rotated to METRICS_PATH.1 (replacing the previous one), so at most twice this is kept
+METRICS_MAX_MB = float(os.getenv("MACRO_METRICS_MAX_MB", "50"))
+PROFILE = os.getenv("MACRO_PROFILE", "0").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("MACRO_PROFILE_DIR", "../logs/profiles")
+# Shared by every process of a run (run_pipeline passes it on to its subprocesses)
+RUN_ID = os.getenv("MACRO_RUN_ID") or f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+_local = threading.local()
+_lock = threading.Lock()
+_profiles = []
+
+def rss_peak_mb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+def rss_mb():
+    # Current resident set size (Linux); None elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def rows_of(value):
+    # Row count of a function result: frames/arrays, the first of a tuple of them, or an
+    # sql_store-style {"rows": n} dict
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, dict):
+        return value.get("rows") if isinstance(value.get("rows"), int) else None
+    if hasattr(value, "shape") and hasattr(value, "__len__"):
+        return len(value)
+    return None
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def current():
+    # Name of this thread's innermost open span (None outside spans); pass it as `parent` to
+    # spans opened on worker threads
+    stack = _stack()
+    return stack[-1]["span"] if stack else None
+
+def add(**counters) -> None:
+    # Add to the innermost open span of this thread (e.g. add(bytes_read=n)); no-op outside spans
+    stack = _stack()
+    if stack:
+        rec = stack[-1]
+        for k, v in counters.items():
+            rec[k] = rec.get(k, 0) + v
+
+def write(record: dict, path: str = METRICS_PATH) -> None:
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path) >= METRICS_MAX_MB * 2**20:
+            os.replace(path, f"{path}.1")
+        with open(path, "a") as f:
+            f.write(line)
+
+@contextmanager
+def profiled(enabled: bool = True):
+    # cProfile for the current thread; skipped if another profiler owns the interpreter
+    prof = cProfile.Profile() if enabled and PROFILE else None
+    try:
+        if prof is not None:
+            prof.enable()
+    except ValueError:
+        prof = None
+    try:
+        yield
+    finally:
+        if prof is not None:
+            prof.disable()
+            with _lock:
+                _profiles.append(prof)
+
+@contextmanager
+def span(name: str, profile: bool = False, parent: str = None, **fields):
+    # Times the block; the yielded dict takes rows/bytes and any extra fields to record
+    if not ENABLED:
+        yield {}
+        return
+    stack = _stack()
+    rec = {"run": RUN_ID, "span": name, "parent": stack[-1]["span"] if stack else parent,
+           "start": time.strftime("%Y-%m-%dT%H:%M:%S"), **fields}
+    stack.append(rec)
+    status = "ok"
+    t0 = time.perf_counter()
+    try:
+        with profiled(profile):
+            yield rec
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        rec["seconds"] = round(time.perf_counter() - t0, 6)
+        stack.pop()
+        if stack:
+            for k in ("bytes_read", "bytes_written"):
+                if k in rec:
+                    stack[-1][k] = stack[-1].get(k, 0) + rec[k]
+        rec.update(status=status, rss_mb=rss_mb(), rss_peak_mb=rss_peak_mb())
+        write(rec)
+
+def instrument(name: str = None, rows=rows_of):
+    # Decorator: one span per call, named module.function, with the result's row count
+    def wrap(fn):
+        span_name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with span(span_name) as rec:
+                result = fn(*args, **kwargs)
+                n = rows(result) if rows else None
+                if n is not None:
+                    rec["rows"] = n
+                return result
+        return wrapper
+    return wrap
+
+def dump_profile(directory: str = PROFILE_DIR):
+    # Merge this run's per-thread profiles into {directory}/{RUN_ID}.prof; returns its path
+    with _lock:
+        profiles, _profiles[:] = list(_profiles), []
+    if not profiles:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    path = f"{directory}/{RUN_ID}.prof"
+    stats = pstats.Stats(profiles[0])
+    for prof in profiles[1:]:
+        stats.add(prof)
+    stats.dump_stats(path)
+    return path
+
+def read_metrics(path: str = METRICS_PATH, run: str = None) -> list:
+    # Recorded spans, optionally of one run (default: all), including the rotated file
+    records = []
+    for p in (f"{path}.1", path):
+        if os.path.exists(p):
+            with open(p) as f:
+                records += [json.loads(line) for line in f if line.strip()]
+    return [r for r in records if run is None or r.get("run") == run]
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+import sql_store
+from sql_store import DB_PATH, DEFAULT_COUNTRY, get_connection
+
+# Materialized summaries over the SQLite store, refreshed per country only when that
+# country's rows changed:
+#   summary_snapshot  latest month's risk fields (the executive snapshot)
+#   summary_last12    last 12 months of the key inputs
+#   stress_rank       every month's stress index with its rank from the bottom and the top,
+#                     indexed so percentile and top-k are B-tree lookups
+#   summary_regime    latest stress index, regime, strategy and historical percentile
+# Views summary_top_high / summary_top_low give the ranked months straight from SQL.
+TOP_N = 10
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS summary_snapshot (
+        country TEXT PRIMARY KEY, date TEXT, risk_level TEXT, risk_score INTEGER, alerts TEXT,
+        cpi_yoy_pct REAL, unrate REAL, fedfunds REAL, us10y REAL)""",
+    """CREATE TABLE IF NOT EXISTS summary_last12 (
+        country TEXT, date TEXT, cpi_yoy_pct REAL, unrate REAL, fedfunds REAL, us10y REAL,
+        risk_level TEXT, risk_score INTEGER, PRIMARY KEY (country, date)) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS stress_rank (
+        country TEXT, date TEXT, macro_stress_index REAL, low_rank INTEGER, high_rank INTEGER,
+        PRIMARY KEY (country, date)) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_stress_rank_value ON stress_rank (country, macro_stress_index)",
+    "CREATE INDEX IF NOT EXISTS idx_stress_rank_low ON stress_rank (country, low_rank)",
+    "CREATE INDEX IF NOT EXISTS idx_stress_rank_high ON stress_rank (country, high_rank)",
+    """CREATE TABLE IF NOT EXISTS summary_regime (
+        country TEXT PRIMARY KEY, date TEXT, macro_stress_index REAL, stress_level TEXT,
+        macro_strategy TEXT, percentile REAL, months INTEGER)""",
+    f"""CREATE VIEW IF NOT EXISTS summary_top_high AS
+        SELECT country, high_rank AS rank, date, macro_stress_index FROM stress_rank WHERE high_rank <= {TOP_N}""",
+    f"""CREATE VIEW IF NOT EXISTS summary_top_low AS
+        SELECT country, low_rank AS rank, date, macro_stress_index FROM stress_rank WHERE low_rank <= {TOP_N}""",
+]
+
+# Same columns and rounding as the original executive queries in sql_store_and_query
+RISK_REFRESH = [
+    "DELETE FROM summary_snapshot WHERE country = :country",
+    """INSERT INTO summary_snapshot
+       SELECT country, date, risk_level, risk_score, alerts,
+              ROUND(us_cpi_yoy_pct,2), ROUND(us_unrate,2), ROUND(us_fedfunds,2), ROUND(us_10y,2)
+       FROM macro_risk WHERE country = :country ORDER BY date DESC LIMIT 1""",
+    "DELETE FROM summary_last12 WHERE country = :country",
+    """INSERT INTO summary_last12
+       SELECT country, date, ROUND(us_cpi_yoy_pct,2), ROUND(us_unrate,2), ROUND(us_fedfunds,2),
+              ROUND(us_10y,2), risk_level, risk_score
+       FROM macro_risk WHERE country = :country ORDER BY date DESC LIMIT 12""",
+]
+INDEX_REFRESH = [
+    "DELETE FROM stress_rank WHERE country = :country",
+    """INSERT INTO stress_rank
+       SELECT country, date, macro_stress_index,
+              ROW_NUMBER() OVER (ORDER BY macro_stress_index ASC, date ASC),
+              ROW_NUMBER() OVER (ORDER BY macro_stress_index DESC, date ASC)
+       FROM macro_index WHERE country = :country AND macro_stress_index IS NOT NULL""",
+    "DELETE FROM summary_regime WHERE country = :country",
+    """INSERT INTO summary_regime
+       SELECT i.country, i.date, i.macro_stress_index, i.stress_level, i.macro_strategy,
+              100.0 * (SELECT COUNT(*) FROM stress_rank r
+                       WHERE r.country = i.country AND r.macro_stress_index < i.macro_stress_index)
+                    / (SELECT MAX(low_rank) FROM stress_rank WHERE country = i.country),
+              (SELECT MAX(low_rank) FROM stress_rank WHERE country = i.country)
+       FROM macro_index i
+       WHERE i.country = :country AND i.macro_stress_index IS NOT NULL
+       ORDER BY i.date DESC LIMIT 1""",
+]
+# Which summaries a store table feeds
+REFRESH = {
+    "macro_risk": (RISK_REFRESH, "summary_snapshot"),
+    "macro_index": (INDEX_REFRESH, "summary_regime"),
+}
+
+def ensure_schema(path: str = DB_PATH) -> None:
+    conn = get_connection(path)
+    with conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+
+def refresh(result: dict, path: str = DB_PATH) -> list:
+    # Refresh the summaries fed by result["table"] (an sql_store.upsert result) for the
+    # countries whose rows changed; summaries never built for a country are built too.
+    # Returns the refreshed countries.
+    if result["table"] not in REFRESH:
+        return []
+    ensure_schema(path)
+    statements, marker = REFRESH[result["table"]]
+    conn = get_connection(path)
+    have = {r[0] for r in conn.execute(f"SELECT country FROM {marker}")}
+    countries = [c for c in result["countries"] if c in result["changed"] or c not in have]
+    with conn:
+        for country in countries:
+            for statement in statements:
+                conn.execute(statement, {"country": country})
+    return countries
+
+def snapshot(country: str = DEFAULT_COUNTRY, path: str = DB_PATH) -> pd.DataFrame:
+    return sql_store.query("SELECT date, risk_level, risk_score, alerts, cpi_yoy_pct, unrate, fedfunds, us10y "
+                           "FROM summary_snapshot WHERE country = ?", (country,), path)
+
+def last12(country: str = DEFAULT_COUNTRY, path: str = DB_PATH) -> pd.DataFrame:
+    return sql_store.query("SELECT date, cpi_yoy_pct, unrate, fedfunds, us10y, risk_level, risk_score "
+                           "FROM summary_last12 WHERE country = ? ORDER BY date DESC", (country,), path)
+
+def regime(country: str = DEFAULT_COUNTRY, path: str = DB_PATH):
+    if not sql_store.has_table("summary_regime", path):
+        return None
+    df = sql_store.query("SELECT * FROM summary_regime WHERE country = ?", (country,), path)
+    return None if df.empty else df.iloc[0]
+
+def top_stress(n: int = TOP_N, high: bool = True, country: str = DEFAULT_COUNTRY, path: str = DB_PATH) -> pd.DataFrame:
+    # The n highest (or lowest) stress months, read in rank order off the rank index
+    rank = "high_rank" if high else "low_rank"
+    return sql_store.query(f"SELECT date, macro_stress_index FROM stress_rank WHERE country = ? AND {rank} <= ? "
+                           f"ORDER BY {rank}", (country, n), path)
+
+def percentile(value: float, country: str = DEFAULT_COUNTRY, path: str = DB_PATH) -> float:
+    # Share of months with a lower stress index (as us_pdf_report.percentile_rank): a range scan
+    # of the (country, macro_stress_index) index. Counted rather than read off low_rank, which
+    # differs between months tied at the same value.
+    conn = get_connection(path)
+    below = conn.execute("SELECT COUNT(*) FROM stress_rank WHERE country = ? AND macro_stress_index < ?",
+                         (country, value)).fetchone()
+    total = conn.execute("SELECT MAX(low_rank) FROM stress_rank WHERE country = ?", (country,)).fetchone()
+    if total[0] is None:
+        return float("nan")
+    return 100.0 * below[0] / total[0]
+
+class StressRanking:
+    # In-memory sorted copy of one country's stress index for repeated lookups:
+    # percentile and top-k by binary search, new months inserted in place
+    def __init__(self, values, dates):
+        order = np.argsort(np.asarray(values, dtype=float), kind="stable")
+        self.values = np.asarray(values, dtype=float)[order]
+        self.dates = pd.DatetimeIndex(dates)[order]
+
+    @classmethod
+    def load(cls, country: str = DEFAULT_COUNTRY, path: str = DB_PATH):
+        df = sql_store.query("SELECT date, macro_stress_index FROM stress_rank WHERE country = ? "
+                             "ORDER BY low_rank", (country,), path)
+        return cls(df["macro_stress_index"].to_numpy(), df["date"])
+
+    def percentile(self, value: float) -> float:
+        return 100.0 * np.searchsorted(self.values, value, side="left") / len(self.values)
+
+    def top(self, n: int = TOP_N, high: bool = True) -> pd.DataFrame:
+        sl = slice(None, -n - 1, -1) if high else slice(None, n)
+        return pd.DataFrame({"date": self.dates[sl], "macro_stress_index": self.values[sl]})
+
+    def add(self, date, value: float) -> None:
+        pos = np.searchsorted(self.values, value, side="right")
+        self.values = np.insert(self.values, pos, value)
+        self.dates = self.dates.insert(pos, pd.Timestamp(date))
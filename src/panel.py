@@ -0,0 +1,220 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import us_macro_build
+from risk_rules import CompiledRules, get_rules
+from storage import exists, load_frame, save_frame
+import us_macro_index
+from us_macro_index import REGIME_STRATEGIES, classify_index_values, component_zscores
+
+# Multi-country panel. Raw observations are held in long format (country, indicator, date,
+# value) with categorical country/indicator codes; the monthly panel is one wide frame indexed
+# by a sorted (country, date) MultiIndex. Features, risk scores and the stress index are
+# computed for every country at once, grouped by the country level.
+RAW_PATH = "../data/raw"
+OUT_PATH = "../data/processed"
+
+# {country: {indicator: FRED series id}}; raw files are stored as {country}_{indicator}.csv,
+# which is the naming the US series already use
+COUNTRIES_PATH = os.getenv("PANEL_COUNTRIES_PATH", "../config/countries.json")
+DEFAULT_COUNTRIES = {
+    "us": {"cpi": "CPIAUCSL", "unrate": "UNRATE", "fedfunds": "FEDFUNDS", "10y": "DGS10"},
+}
+
+# Panel columns are the US column names without the country prefix; rules written for the
+# US panel (us_cpi_yoy_pct, ...) are mapped onto them the same way
+PREFIX = "us_"
+INDICATORS = {name[len(PREFIX):]: spec for name, spec in us_macro_build.MONTHLY_SERIES.items()}
+FEATURE_INDICATORS = [c[len(PREFIX):] for c in us_macro_build.FEATURE_COLS]
+STRESS_COMPONENTS = {z: col[len(PREFIX):] for z, col in us_macro_index.STRESS_COMPONENTS.items()}
+
+def load_countries(path: str = COUNTRIES_PATH) -> dict:
+    if not os.path.exists(path):
+        return DEFAULT_COUNTRIES
+    with open(path) as f:
+        return json.load(f)
+
+def fred_series(countries: dict) -> dict:
+    # Flat {name: series id} in the form fred_multi.sync_all expects
+    return {f"{c}_{ind}": sid for c, inds in countries.items() for ind, sid in inds.items()}
+
+def fetch_countries(countries: dict = None) -> dict:
+    import fred_multi
+
+    frames, _ = fred_multi.sync_all(fred_series(countries or load_countries()))
+    return frames
+
+def to_long(frames: dict) -> pd.DataFrame:
+    # frames: {(country, indicator): df with date/value columns} -> long panel sorted by
+    # (country, indicator, date)
+    keys = list(frames)
+    sizes = [len(frames[k]) for k in keys]
+    countries = sorted({c for c, _ in keys})
+    indicators = [i for i in INDICATORS if any(k[1] == i for k in keys)]
+    indicators += sorted({i for _, i in keys} - set(indicators))
+
+    country_codes = np.repeat(np.array([countries.index(c) for c, _ in keys], dtype=np.int16), sizes)
+    indicator_codes = np.repeat(np.array([indicators.index(i) for _, i in keys], dtype=np.int16), sizes)
+
+    long = pd.DataFrame({
+        "country": pd.Categorical.from_codes(country_codes, categories=countries),
+        "indicator": pd.Categorical.from_codes(indicator_codes, categories=indicators),
+        "date": np.concatenate([frames[k]["date"].to_numpy() for k in keys]) if keys else np.array([], "datetime64[ns]"),
+        "value": np.concatenate([frames[k]["value"].to_numpy(dtype=float) for k in keys]) if keys else np.array([]),
+    })
+    return long.sort_values(["country", "indicator", "date"], kind="stable").reset_index(drop=True)
+
+def read_long(countries: dict = None, raw_path: str = RAW_PATH) -> pd.DataFrame:
+    frames = {}
+    for country, indicators in (countries or load_countries()).items():
+        for ind in indicators:
+            path = f"{raw_path}/{country}_{ind}.csv"
+            if exists(path):
+                frames[(country, ind)] = load_frame(path)
+            else:
+                print(f"⚠ No raw data for {country}/{ind} ({path})")
+    return to_long(frames)
+
+def monthly_panel(long: pd.DataFrame, indicators: dict = INDICATORS) -> pd.DataFrame:
+    # Every (country, indicator) series reduced to month-start frequency in one groupby per
+    # aggregation. Each country keeps the months where all of its indicators overlap, like
+    # us_macro_build.align_monthly; countries missing an indicator are left out.
+    names = [i for i in indicators if i in long["indicator"].cat.categories]
+    country_names = long["country"].cat.categories
+    country = long["country"].cat.codes.to_numpy()
+    indicator = long["indicator"].cat.codes.to_numpy()
+    dtype = long["date"].dtype
+    month = long["date"].to_numpy().astype("datetime64[M]")
+    values = long["value"].to_numpy(dtype=float)
+    codes = {name: long["indicator"].cat.categories.get_loc(name) for name in names}
+
+    # Overlap window per country: latest first month .. earliest last month across indicators
+    ticks = month.astype(np.int64)
+    span = pd.DataFrame({"country": country, "indicator": indicator, "m": ticks}) \
+        .groupby(["country", "indicator"])["m"].agg(["min", "max"])
+    span = span[span.index.get_level_values("indicator").isin(list(codes.values()))]
+    per_country = span.groupby(level="country").agg(n=("min", "size"), start=("min", "max"), end=("max", "min"))
+    complete = per_country[(per_country["n"] == len(names)) & (per_country["start"] <= per_country["end"])]
+    for c in sorted(set(range(len(country_names))) - set(complete.index)):
+        print(f"⚠ {country_names[c]} has no months covering all indicators; left out of the panel")
+
+    lengths = (complete["end"] - complete["start"] + 1).to_numpy()
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    index_country = np.repeat(complete.index.to_numpy(), lengths)
+    index_month = np.repeat(complete["start"].to_numpy(), lengths) + (np.arange(lengths.sum()) - offsets)
+    index_month = index_month.astype("datetime64[M]").astype(dtype)
+    index = pd.MultiIndex.from_arrays([index_country, index_month], names=["country", "date"])
+
+    by_agg = {}
+    for name in names:
+        by_agg.setdefault(indicators[name]["agg"], []).append(codes[name])
+
+    blocks = []
+    for agg, group in by_agg.items():
+        sel = np.isin(indicator, group)
+        keyed = pd.DataFrame({
+            "country": country[sel],
+            "indicator": indicator[sel],
+            "date": month[sel].astype(dtype),
+            "value": values[sel],
+        })
+        reduced = keyed.groupby(["country", "indicator", "date"], sort=True)["value"].agg(agg)
+        wide = reduced.unstack("indicator")
+        wide.columns = [long["indicator"].cat.categories[i] for i in wide.columns]
+        blocks.append(wide.reindex(index))
+
+    panel = pd.concat(blocks, axis=1)[names] if blocks else pd.DataFrame(index=index, columns=names, dtype=float)
+    panel.index = pd.MultiIndex.from_arrays(
+        [pd.Categorical.from_codes(index_country, categories=country_names), index.get_level_values("date")],
+        names=["country", "date"],
+    )
+    return panel
+
+def grouped_shift(panel: pd.DataFrame, col: str, periods: int) -> np.ndarray:
+    # Per-country shift on the (country, date)-sorted panel: a plain shift, blanked where the
+    # row `periods` back belongs to another country
+    x = panel[col].to_numpy(dtype=float)
+    codes = panel.index.codes[0]
+    out = np.full(len(x), np.nan)
+    if periods < len(x):
+        out[periods:] = x[:-periods]
+        out[periods:][codes[periods:] != codes[:-periods]] = np.nan
+    return out
+
+def add_features(panel: pd.DataFrame, cols: list = FEATURE_INDICATORS) -> pd.DataFrame:
+    # Same features as us_macro_build.add_features, per country (bit-identical for each one)
+    panel = panel.copy()
+    grouped = panel.groupby(level="country", sort=False, observed=True)
+    for col in cols:
+        x = panel[col].to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            panel[f"{col}_mom_pct"] = (x / grouped_shift(panel, col, 1) - 1) * 100
+            panel[f"{col}_yoy_pct"] = (x / grouped_shift(panel, col, 12) - 1) * 100
+        for w in (3, 6):
+            panel[f"{col}_roll{w}"] = grouped[col].rolling(w).mean().droplevel(0)
+    return panel
+
+def rule_view(panel: pd.DataFrame, rules: CompiledRules) -> pd.DataFrame:
+    # The panel under the rule set's column names (us_cpi_yoy_pct -> cpi_yoy_pct), no copy
+    def panel_col(c):
+        return c[len(PREFIX):] if c.startswith(PREFIX) and c not in panel.columns else c
+    return pd.DataFrame({c: panel[panel_col(c)] for c in rules.columns}, copy=False)
+
+def score_risk(panel: pd.DataFrame, rules: CompiledRules = None) -> pd.DataFrame:
+    rules = rules or get_rules()
+    panel = panel.copy()
+    scores, alerts, levels = rules.evaluate(rule_view(panel, rules))
+    panel["risk_score"] = scores
+    panel["alerts"] = alerts
+    panel["risk_level"] = levels
+    return panel
+
+def build_index(panel: pd.DataFrame, mode: str = us_macro_index.ZSCORE_MODE,
+                window: int = us_macro_index.ZSCORE_WINDOW) -> pd.DataFrame:
+    # us_macro_index.build_index per country: z-scores use each country's own mean/std
+    panel = panel.copy()
+    if mode == "full":
+        grouped = panel.groupby(level="country", sort=False, observed=True)
+        for z, col in STRESS_COMPONENTS.items():
+            panel[z] = (panel[col] - grouped[col].transform("mean")) / grouped[col].transform("std")
+    else:
+        # One streaming pass over a (date x country*component) grid normalizes every
+        # country's components at once; a country's rows start where its history does
+        wide = panel[list(STRESS_COMPONENTS.values())].unstack("country")
+        z = component_zscores(wide.to_numpy(dtype=float), mode, window)
+        z = pd.DataFrame(z, index=wide.index, columns=wide.columns).stack("country", future_stack=True)
+        z = z.reorder_levels(["country", "date"]).reindex(panel.index)
+        for zc, col in STRESS_COMPONENTS.items():
+            panel[zc] = z[col].to_numpy()
+    panel["macro_stress_index"] = panel[list(STRESS_COMPONENTS)].sum(axis=1, skipna=False)
+
+    # Remove rows where index cannot be calculated
+    panel = panel.dropna(subset=["macro_stress_index"])
+    panel["stress_level"] = classify_index_values(panel["macro_stress_index"])
+    panel["macro_strategy"] = panel["stress_level"].map(REGIME_STRATEGIES)
+    return panel
+
+def build_panel(long: pd.DataFrame, rules: CompiledRules = None) -> pd.DataFrame:
+    return build_index(score_risk(add_features(monthly_panel(long)), rules))
+
+def latest(panel: pd.DataFrame) -> pd.DataFrame:
+    # Most recent month per country
+    return panel.groupby(level="country", sort=False, observed=True).tail(1)
+
+def save_panel(long: pd.DataFrame, panel: pd.DataFrame) -> str:
+    save_frame(long, f"{OUT_PATH}/panel_long.csv")
+    return save_frame(panel.reset_index(), f"{OUT_PATH}/panel_monthly.csv")
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    long = read_long()
+    panel = build_panel(long)
+    out_file = save_panel(long, panel)
+
+    countries = panel.index.get_level_values("country").nunique()
+    print(f"✅ Built panel: {out_file} ({countries} countries, {len(panel)} rows) in {time.perf_counter() - t0:.2f}s")
+    print(latest(panel)[["macro_stress_index", "stress_level", "risk_score", "risk_level"]])
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+import stress_forecast
+import us_pdf_report
+from storage import exists, load_frame
+
+# One executive brief per country of the panel (see panel.py), rendered from the
+# us_pdf_report layout. The panel is loaded once; each worker process gets one entity's
+# history, forecasts it, fills the template and writes the PDF.
+#
+# Embedding the chart PNG costs more than the rest of a brief: reportlab decodes and
+# re-compresses it for every document. Charts are therefore prepared once per run: as a JPEG
+# copy (IMAGE_FORMAT=jpeg, embedded byte for byte) kept in IMAGE_CACHE under the PNG's
+# content hash, or, with IMAGE_FORMAT=png, as a decoded ImageReader cached in each worker.
+# Streams are written binary rather than ASCII85-encoded, which reportlab does in pure Python
+# unless its C accelerator is installed. The briefs use reportlab's built-in Helvetica faces,
+# so there are no fonts to load or embed.
+PANEL_PATH = "../data/processed/panel_monthly.csv"
+OUT_DIR = "../reports/briefs"
+CHART_DIR = "../reports/charts"           # optional per-entity charts: {entity}_stress_index_recent.png
+IMAGE_CACHE = "../reports/.image_cache"
+IMAGE_FORMAT = os.getenv("PDF_BATCH_IMAGE_FORMAT", "jpeg")  # jpeg | png
+JPEG_QUALITY = int(os.getenv("PDF_BATCH_JPEG_QUALITY", "95"))
+WORKERS = int(os.getenv("PDF_BATCH_WORKERS", str(os.cpu_count() or 1)))
+CHUNKSIZE = int(os.getenv("PDF_BATCH_CHUNKSIZE", "4"))
+
+_readers = {}
+
+def chart_for(entity: str, chart_dir: str = CHART_DIR):
+    path = f"{chart_dir}/{entity}_stress_index_recent.png"
+    if os.path.exists(path):
+        return path
+    if entity == "us" and os.path.exists(us_pdf_report.CHART_PATH):
+        return us_pdf_report.CHART_PATH
+    return None
+
+def prepare_image(path: str, fmt: str = IMAGE_FORMAT) -> str:
+    # The file to embed for `path`; JPEG copies are made once per distinct PNG content
+    if path is None or fmt != "jpeg":
+        return path
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:16]
+    out = f"{IMAGE_CACHE}/{digest}_q{JPEG_QUALITY}.jpg"
+    if not os.path.exists(out):
+        os.makedirs(IMAGE_CACHE, exist_ok=True)
+        tmp = f"{out}.{os.getpid()}.tmp"
+        Image.open(path).convert("RGB").save(tmp, "JPEG", quality=JPEG_QUALITY)
+        os.replace(tmp, out)
+    return out
+
+def cached_reader(path: str):
+    # Per-process: a PNG is decoded once, however many briefs embed it
+    if path is None or path.endswith(".jpg"):
+        return path
+    if path not in _readers:
+        _readers[path] = ImageReader(path)
+    return _readers[path]
+
+def load_entities(path: str = PANEL_PATH) -> dict:
+    # {entity: index history sorted by date}, from the saved panel (built on the fly if missing)
+    if exists(path):
+        panel = load_frame(path)
+    else:
+        import panel as panel_builder
+        panel = panel_builder.build_panel(panel_builder.read_long()).reset_index()
+    panel = panel.dropna(subset=["macro_stress_index"]).sort_values(["country", "date"])
+    return {str(c): g.reset_index(drop=True) for c, g in panel.groupby("country", sort=True, observed=True)}
+
+def render_brief(job) -> str:
+    entity, df, chart, out_path = job
+    fc = stress_forecast.forecast(df) if len(df) >= 3 else None
+    top = df.nlargest(3, "macro_stress_index")
+    fields = us_pdf_report.brief_fields(df, fc, top, entity=entity.upper())
+    a85, rl_config.useA85 = rl_config.useA85, 0
+    try:
+        c = canvas.Canvas(out_path, pagesize=A4)
+        us_pdf_report.draw_brief(c, fields, cached_reader(chart))
+        c.save()
+    finally:
+        rl_config.useA85 = a85
+    return out_path
+
+def make_briefs(entities: dict, out_dir: str = OUT_DIR, workers: int = WORKERS,
+                image_format: str = IMAGE_FORMAT, chart_dir: str = CHART_DIR) -> list:
+    os.makedirs(out_dir, exist_ok=True)
+    sources = {entity: chart_for(entity, chart_dir) for entity in entities}
+    charts = {path: prepare_image(path, image_format) for path in set(sources.values())}
+    jobs = [(entity, df, charts[sources[entity]], f"{out_dir}/{entity}_executive_brief.pdf")
+            for entity, df in entities.items()]
+
+    if workers <= 1 or len(jobs) < 2:
+        return [render_brief(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(render_brief, jobs, chunksize=CHUNKSIZE))
+
+if __name__ == "__main__":
+    t0 = time.perf_counter()
+    entities = load_entities()
+    loaded = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    files = make_briefs(entities)
+    seconds = time.perf_counter() - t0
+    print(f"✅ {len(files)} briefs in {seconds:.2f}s ({len(files) / seconds:.1f} briefs/s, "
+          f"{WORKERS} workers, panel loaded in {loaded:.2f}s) -> {OUT_DIR}")
@@ -0,0 +1,304 @@
+import hashlib
+import inspect
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import tracemalloc
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+import pandas as pd
+
+import instrumentation
+import storage
+from instrumentation import rss_peak_mb
+
+# In-process DAG runner: each stage is a function whose keyword arguments are named
+# artifacts produced by earlier stages. Artifacts (DataFrames, paths, ...) stay in memory,
+# and stages whose inputs are ready run concurrently on a thread pool.
+MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "4"))
+# Process RSS high-water mark is always recorded; tracemalloc gives a per-stage peak but slows
+# pandas-heavy stages several times over, so it is opt-in.
+TRACE_MEMORY = os.getenv("PIPELINE_TRACE_MEMORY", "0").lower() in ("1", "true", "yes")
+# Stage memoization: a stage whose inputs and code are unchanged reuses its last outputs
+CACHE_ENABLED = os.getenv("PIPELINE_CACHE", "1").lower() not in ("0", "false", "no")
+CACHE_DIR = os.getenv("PIPELINE_CACHE_DIR", "../data/cache/stages")
+CACHE_KEEP = int(os.getenv("PIPELINE_CACHE_KEEP", "3"))  # entries kept per stage
+
+logger = logging.getLogger(__name__)
+
+class StageFailed(RuntimeError):
+    def __init__(self, stage: str, error: Exception):
+        super().__init__(f"Pipeline failed at {stage}: {error!r}")
+        self.stage = stage
+        self.error = error
+
+@dataclass
+class Stage:
+    name: str
+    func: callable
+    inputs: tuple = ()
+    outputs: tuple = ()
+    version: str = "1"   # bump to invalidate cached outputs on a config/logic change
+    code: tuple = ()     # modules whose source is part of the cache key
+    files: tuple = ()    # config files whose contents are part of the cache key
+    cache: bool = True   # False for stages that must always run (e.g. network fetch)
+    writes: tuple = ()   # side effects a cache hit relies on: saved frames, or (sqlite db, table) pairs
+
+    def call(self, artifacts: dict) -> dict:
+        result = self.func(**{name: artifacts[name] for name in self.inputs})
+        if not self.outputs:
+            return {}
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        return dict(zip(self.outputs, result))
+
+def artifact_digest(value) -> str:
+    h = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        h.update(repr((list(value.columns), [str(t) for t in value.dtypes])).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(repr((value.name, str(value.dtype))).encode())
+        h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, dict):
+        for k in sorted(value, key=repr):
+            h.update(repr(k).encode())
+            h.update(artifact_digest(value[k]).encode())
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            h.update(artifact_digest(v).encode())
+    elif value is None or isinstance(value, (str, bytes, int, float, bool)):
+        h.update(repr(value).encode())
+    else:
+        h.update(pickle.dumps(value))
+    return h.hexdigest()
+
+def code_digest(stage: Stage) -> str:
+    h = hashlib.sha256(stage.version.encode())
+    for obj in (stage.func, *stage.code):
+        try:
+            h.update(inspect.getsource(obj).encode())
+        except (OSError, TypeError):
+            h.update(getattr(getattr(obj, "__code__", None), "co_code", repr(obj).encode()))
+    for path in stage.files:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+def written(target) -> bool:
+    # A stage's side effect is still there: a frame saved with storage.save_frame (any format),
+    # or a table / view in a SQLite database
+    if isinstance(target, tuple):
+        db, table = target
+        if not os.path.exists(db):
+            return False
+        conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True, timeout=30)
+        try:
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?",
+                                (table,)).fetchone() is not None
+        finally:
+            conn.close()
+    return os.path.exists(target) or storage.exists(target)
+
+class StageCache:
+    # Pickled stage outputs on disk, keyed by stage code + input artifact digests
+    def __init__(self, directory: str = CACHE_DIR, keep: int = CACHE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self.stats = {"hits": 0, "misses": 0}
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def digest(self, value) -> str:
+        # Artifacts are shared by several consumers; hash each object once per run
+        key = id(value)
+        with self._lock:
+            if key in self._digests and self._digests[key][0] is value:
+                return self._digests[key][1]
+        d = artifact_digest(value)
+        with self._lock:
+            self._digests[key] = (value, d)
+        return d
+
+    def key(self, stage: Stage, artifacts: dict) -> str:
+        h = hashlib.sha256(code_digest(stage).encode())
+        for name in stage.inputs:
+            h.update(name.encode())
+            h.update(self.digest(artifacts[name]).encode())
+        return h.hexdigest()[:32]
+
+    def _path(self, stage: Stage, key: str) -> str:
+        return os.path.join(self.directory, stage.name, f"{key}.pkl")
+
+    def get(self, stage: Stage, key: str):
+        try:
+            with open(self._path(stage, key), "rb") as f:
+                outputs = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        # Outputs that are file paths (charts, reports) must still exist to count as a hit
+        for value in outputs.values():
+            paths = value if isinstance(value, (list, tuple)) else [value]
+            if any(isinstance(p, str) and not os.path.exists(p) for p in paths):
+                return None
+        # So must the files and tables it wrote along the way (deleted macro.db, wiped data/processed)
+        if not all(written(target) for target in stage.writes):
+            return None
+        return outputs
+
+    def put(self, stage: Stage, key: str, outputs: dict) -> None:
+        path = self._path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(outputs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+        folder = os.path.dirname(path)
+        entries = sorted((os.path.getmtime(os.path.join(folder, n)), n) for n in os.listdir(folder) if n.endswith(".pkl"))
+        for _, name in entries[:-self.keep]:
+            os.remove(os.path.join(folder, name))
+
+    def count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def reset(self) -> None:
+        # Forget the artifacts hashed so far; long-lived pipelines call this between runs so the
+        # memo does not keep every past artifact alive
+        with self._lock:
+            self._digests.clear()
+
+class Pipeline:
+    def __init__(self, stages: list, max_workers: int = MAX_WORKERS, cache: StageCache = None):
+        self.stages = {s.name: s for s in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+
+        self.producers = {}
+        for s in stages:
+            for out in s.outputs:
+                if out in self.producers:
+                    raise ValueError(f"Artifact {out!r} produced by both {self.producers[out]} and {s.name}")
+                self.producers[out] = s.name
+        self.max_workers = max_workers
+        self.cache = cache if cache is not None else (StageCache() if CACHE_ENABLED else None)
+        self.order()  # fail fast on cycles / unknown inputs
+
+    def deps(self, name: str, provided=()) -> set:
+        missing = [i for i in self.stages[name].inputs if i not in self.producers and i not in provided]
+        if missing:
+            raise ValueError(f"Stage {name} needs {missing}, which no stage produces")
+        return {self.producers[i] for i in self.stages[name].inputs if i not in provided}
+
+    def order(self, provided=()) -> list:
+        # Topological order (Kahn); also the sequential fallback order
+        deps = {n: self.deps(n, provided) for n in self.stages}
+        ordered, done = [], set()
+        while len(ordered) < len(deps):
+            ready = [n for n in deps if n not in done and deps[n] <= done]
+            if not ready:
+                raise ValueError(f"Dependency cycle among {sorted(set(deps) - done)}")
+            ordered.extend(ready)
+            done.update(ready)
+        return ordered
+
+    def downstream(self, names) -> set:
+        # The given stages plus every stage that (transitively) consumes their outputs
+        out = set(names)
+        for n in self.order():
+            if any(p in out for p in self.deps(n)):
+                out.add(n)
+        return out
+
+    def run(self, artifacts: dict = None, only=None):
+        # Returns (artifacts, timings). `only` limits the run to a subset of stages; their other
+        # inputs must then be supplied in `artifacts`.
+        artifacts = dict(artifacts or {})
+        names = [n for n in self.order(artifacts) if only is None or n in only]
+        deps = {n: self.deps(n, artifacts) & set(names) for n in names}
+        timings = []
+        active = [0]
+        lock = threading.Lock()
+        parent = instrumentation.current()  # stages run on pool threads
+
+        if TRACE_MEMORY and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        def execute(stage):
+            with lock:
+                if TRACE_MEMORY and active[0] == 0:
+                    tracemalloc.reset_peak()
+                active[0] += 1
+            t0 = time.perf_counter()
+            cached = None
+            with instrumentation.span(f"stage.{stage.name}", profile=True, parent=parent) as rec:
+                try:
+                    if self.cache is not None and stage.cache:
+                        key = self.cache.key(stage, artifacts)
+                        outputs = self.cache.get(stage, key)
+                        cached = outputs is not None
+                        if cached:
+                            self.cache.count("hits")
+                            logger.info(f"Cache hit for stage {stage.name} ({key}), skipping")
+                            return outputs
+                        self.cache.count("misses")
+                        logger.info(f"Cache miss for stage {stage.name} ({key})")
+                        outputs = stage.call(artifacts)
+                        self.cache.put(stage, key, outputs)
+                        return outputs
+                    return stage.call(artifacts)
+                finally:
+                    rec["cached"] = cached
+                    seconds = time.perf_counter() - t0
+                    with lock:
+                        active[0] -= 1
+                        # Peak traced memory while the stage ran (shared with any stage overlapping it)
+                        peak = tracemalloc.get_traced_memory()[1] / 1e6 if TRACE_MEMORY else None
+                        timings.append({"stage": stage.name, "seconds": seconds, "peak_mb": peak,
+                                        "rss_peak_mb": rss_peak_mb(), "cached": cached})
+
+        pending, done, running = list(names), set(), {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for n in [n for n in pending if deps[n] <= done]:
+                    pending.remove(n)
+                    logger.info(f"Running stage {n}")
+                    running[pool.submit(execute, self.stages[n])] = n
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    n = running.pop(fut)
+                    try:
+                        artifacts.update(fut.result())
+                    except Exception as e:
+                        for other in running:
+                            other.cancel()
+                        logger.error(f"Pipeline failed at {n}: {e!r}")
+                        raise StageFailed(n, e) from e
+                    done.add(n)
+
+        for t in timings:
+            peak = f"{t['peak_mb']:.1f}MB" if t["peak_mb"] is not None else "n/a"
+            rss = f"{t['rss_peak_mb']:.0f}MB" if t["rss_peak_mb"] is not None else "n/a"
+            logger.info(f"Stage {t['stage']} finished in {t['seconds']:.2f}s (peak {peak}, RSS {rss})")
+        if self.cache is not None:
+            logger.info(f"Stage cache: {self.cache.stats['hits']} hits, {self.cache.stats['misses']} misses")
+        return artifacts, timings
+
+def format_timings(timings: list) -> str:
+    def mb(v):
+        return f"{v:8.1f}" if v is not None else f"{'n/a':>8}"
+
+    def cache(v):
+        return {True: "hit", False: "miss"}.get(v, "-")
+
+    lines = [f"{'stage':<10} {'seconds':>8} {'peak MB':>8} {'RSS MB':>8} {'cache':>6}"]
+    for t in timings:
+        lines.append(f"{t['stage']:<10} {t['seconds']:8.2f} {mb(t['peak_mb'])} {mb(t['rss_peak_mb'])} {cache(t['cached']):>6}")
+    return "\n".join(lines)
@@ -0,0 +1,210 @@
+import itertools
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Risk rule definitions live in config/risk_rules.json. They are compiled once into arrays
+# (column positions, operators, thresholds, weights) and recompiled only when the file changes.
+RULES_PATH = os.getenv("RISK_RULES_PATH", "../config/risk_rules.json")
+BATCH_CELLS = int(os.getenv("RISK_BATCH_CELLS", str(50_000_000)))  # max sets x rows x rules per chunk
+
+# Built-in rule set, used when the config file is absent
+DEFAULT_RULES = {
+    "rules": [
+        # Inflation risk
+        {"column": "us_cpi_yoy_pct", "op": ">", "threshold": 4, "weight": 2, "alert": "High Inflation Risk"},
+        # Unemployment rising
+        {"column": "us_unrate_mom_pct", "op": ">", "threshold": 0.5, "weight": 1, "alert": "Rising Unemployment Risk"},
+        # Interest rate pressure
+        {"column": "us_fedfunds", "op": ">", "threshold": 4, "weight": 2, "alert": "High Interest Rate Environment"},
+        # Yield stress
+        {"column": "us_10y", "op": ">", "threshold": 4, "weight": 1, "alert": "Bond Yield Stress"},
+    ],
+    "levels": [
+        {"min_score": 5, "level": "HIGH RISK"},
+        {"min_score": 3, "level": "MEDIUM RISK"},
+    ],
+    "default_level": "LOW RISK",
+}
+
+OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+}
+
+class CompiledRules:
+    def __init__(self, spec: dict):
+        rules = spec["rules"]
+        if not rules:
+            raise ValueError("A rule set needs at least one rule")
+        for r in rules:
+            missing = {"column", "op", "threshold", "weight", "alert"} - set(r)
+            if missing:
+                raise ValueError(f"Rule {r} is missing {sorted(missing)}")
+            if r["op"] not in OPERATORS:
+                raise ValueError(f"Unknown operator {r['op']!r}; use one of {sorted(OPERATORS)}")
+            # Scores are integer sums compared against the levels' min_score
+            if not isinstance(r["weight"], (int, float)) or not float(r["weight"]).is_integer():
+                raise ValueError(f"Rule {r} has a non-integer weight; weights are whole points")
+
+        self.spec = spec
+        self.columns = list(dict.fromkeys(r["column"] for r in rules))
+        self.col_idx = np.array([self.columns.index(r["column"]) for r in rules])
+        self.ops = [r["op"] for r in rules]
+        self.op_groups = {op: np.array([j for j, o in enumerate(self.ops) if o == op]) for op in set(self.ops)}
+        self.thresholds = np.array([r["threshold"] for r in rules], dtype=float)
+        self.weights = np.array([r["weight"] for r in rules], dtype=np.int64)
+        self.alerts = [r["alert"] for r in rules]
+        levels = sorted(spec.get("levels", []), key=lambda lv: -lv["min_score"])
+        self.level_cuts = [lv["min_score"] for lv in levels]
+        self.level_names = [lv["level"] for lv in levels]
+        self.default_level = spec.get("default_level", "LOW RISK")
+
+    @property
+    def signature(self):
+        # Rule sets with the same signature differ only in thresholds/weights and batch together
+        return tuple(zip((self.columns[i] for i in self.col_idx), self.ops))
+
+    def values(self, df: pd.DataFrame) -> np.ndarray:
+        # (rows x rules) inputs, one column per rule
+        cols = np.column_stack([df[c].to_numpy(dtype=float, na_value=np.nan) for c in self.columns])
+        return cols[:, self.col_idx]
+
+    def masks(self, df: pd.DataFrame) -> np.ndarray:
+        # (rows x rules) boolean matrix; NaN never fires
+        values = self.values(df)
+        masks = np.empty(values.shape, dtype=bool)
+        for op, idx in self.op_groups.items():
+            masks[:, idx] = OPERATORS[op](values[:, idx], self.thresholds[idx])
+        return masks
+
+    def alert_text(self, masks: np.ndarray) -> np.ndarray:
+        # Each row's fired rules as a bit pattern; the joined text is built once per distinct pattern
+        codes = masks.astype(np.int64) @ (1 << np.arange(masks.shape[1], dtype=np.int64))
+        patterns, inverse = np.unique(codes, return_inverse=True)
+        labels = np.array([
+            "; ".join(a for j, a in enumerate(self.alerts) if code >> j & 1)
+            for code in patterns
+        ], dtype=object)
+        return labels[inverse.reshape(-1)]
+
+    def classify(self, scores: np.ndarray) -> np.ndarray:
+        return np.select([scores >= cut for cut in self.level_cuts],
+                         self.level_names, self.default_level).astype(object)
+
+    def evaluate(self, df: pd.DataFrame):
+        # Returns (scores, alerts, levels) arrays aligned with df's rows
+        masks = self.masks(df)
+        scores = masks.astype(np.int64) @ self.weights
+        return scores, self.alert_text(masks), self.classify(scores)
+
+def compile_rules(spec: dict) -> CompiledRules:
+    return CompiledRules(spec)
+
+_loaded = {}
+_load_lock = threading.Lock()
+
+def get_rules(path: str = RULES_PATH) -> CompiledRules:
+    # Compiled rules for `path`, recompiled whenever the file's mtime/size change
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        stamp = None
+    else:
+        stamp = (st.st_mtime_ns, st.st_size)
+
+    with _load_lock:
+        cached = _loaded.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        if stamp is None:
+            compiled = compile_rules(DEFAULT_RULES)
+        else:
+            with open(path) as f:
+                compiled = compile_rules(json.load(f))
+        _loaded[path] = (stamp, compiled)
+        return compiled
+
+def evaluate_rule_sets(df: pd.DataFrame, specs: list) -> np.ndarray:
+    # Scores for N rule sets over the same panel in one batched pass per rule-set signature:
+    # values (rows x rules) are compared against a (sets x rules) threshold matrix by broadcasting.
+    # Returns an (N x rows) int matrix.
+    compiled = [s if isinstance(s, CompiledRules) else compile_rules(s) for s in specs]
+    scores = np.empty((len(compiled), len(df)), dtype=np.int64)
+
+    groups = {}
+    for i, c in enumerate(compiled):
+        groups.setdefault(c.signature, []).append(i)
+
+    for members in groups.values():
+        first = compiled[members[0]]
+        values = first.values(df)                                        # (T x K)
+        thresholds = np.stack([compiled[i].thresholds for i in members])  # (N x K)
+        weights = np.stack([compiled[i].weights for i in members])        # (N x K)
+        step = max(1, BATCH_CELLS // max(1, values.size))
+
+        for lo in range(0, len(members), step):
+            th, w = thresholds[lo:lo + step], weights[lo:lo + step]
+            masks = np.empty((len(th), *values.shape), dtype=bool)        # (n x T x K)
+            for op, idx in first.op_groups.items():
+                masks[:, :, idx] = OPERATORS[op](values[None, :, idx], th[:, None, idx])
+            scores[members[lo:lo + step]] = np.einsum("ntk,nk->nt", masks, w)
+    return scores
+
+def threshold_grid(base: dict, grid: dict) -> list:
+    # Cartesian product of alternative thresholds. grid maps a rule's column (or alert label)
+    # to the thresholds to try, e.g. {"us_cpi_yoy_pct": [3, 4, 5], "us_fedfunds": [3.5, 4, 5]}.
+    keys = list(grid)
+    specs = []
+    for combo in itertools.product(*(grid[k] for k in keys)):
+        chosen = dict(zip(keys, combo))
+        rules = []
+        for r in base["rules"]:
+            r = dict(r)
+            for key in (r["column"], r["alert"]):
+                if key in chosen:
+                    r["threshold"] = chosen[key]
+            rules.append(r)
+        specs.append({**base, "rules": rules, "params": chosen})
+    return specs
+
+def sweep(df: pd.DataFrame, specs: list) -> pd.DataFrame:
+    # One row per rule set: its parameters, the share of months at each risk level, the latest score
+    compiled = [compile_rules(s) for s in specs]
+    scores = evaluate_rule_sets(df, compiled)
+    rows = []
+    for spec, c, s in zip(specs, compiled, scores):
+        levels = c.classify(s)
+        row = dict(spec.get("params", {}))
+        for name in [*c.level_names, c.default_level]:
+            row[f"share_{name}"] = float(np.mean(levels == name)) if len(s) else 0.0
+        row["latest_score"] = int(s[-1]) if len(s) else None
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+    from storage import load_frame
+
+    df = load_frame("../data/processed/macro_us_monthly.csv").sort_values("date")
+    if os.path.exists(RULES_PATH):
+        with open(RULES_PATH) as f:
+            base = json.load(f)
+    else:
+        base = DEFAULT_RULES
+    specs = threshold_grid(base, {
+        "us_cpi_yoy_pct": np.arange(2.0, 7.01, 0.5).tolist(),
+        "us_unrate_mom_pct": [0.25, 0.5, 1.0, 2.0],
+        "us_fedfunds": np.arange(2.0, 6.01, 0.5).tolist(),
+        "us_10y": [3.0, 4.0, 5.0],
+    })
+
+    t0 = time.perf_counter()
+    summary = sweep(df, specs)
+    print(f"✅ Evaluated {len(specs)} rule sets x {len(df)} months in {time.perf_counter() - t0:.2f}s")
+    print(summary.sort_values("share_HIGH RISK", ascending=False).head(10).to_string(index=False))
@@ -3,6 +3,9 @@ import sys
 import os
 import logging
 
+import instrumentation
+from pipeline import Pipeline, Stage, StageFailed, format_timings
+
 os.makedirs("../logs", exist_ok=True)
 
 logging.basicConfig(
@@ -11,6 +14,9 @@ logging.basicConfig(
     format="%(asctime)s | %(levelname)s | %(message)s"
 )
 
+# "inprocess" runs the stage DAG below; "subprocess" runs the legacy one-script-per-step chain
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "inprocess")
+
 scripts = [
     "fred_multi.py",
     "us_macro_build.py",
@@ -25,7 +31,11 @@ def run_script(script):
     logging.info(f"Running {script}")
     print(f"\n▶ Running {script}...")
 
-    result = subprocess.run([sys.executable, script], capture_output=True, text=True)
+    # Scripts record their spans under this run's id
+    env = {**os.environ, "MACRO_RUN_ID": instrumentation.RUN_ID}
+    with instrumentation.span(f"script.{script}") as rec:
+        result = subprocess.run([sys.executable, script], capture_output=True, text=True, env=env)
+        rec["returncode"] = result.returncode
 
     if result.stdout:
         logging.info(result.stdout.strip())
@@ -37,9 +47,138 @@ def run_script(script):
         logging.error(f"Pipeline failed at {script}")
         sys.exit(1)
 
+def build_pipeline() -> Pipeline:
+    import chart_renderer
+    import fred_multi
+    import macro_summary
+    import risk_rules
+    import scenarios as scenario_engine
+    import sql_store
+    import sql_store_and_query
+    import stress_forecast
+    import us_excel_report
+    import us_macro_build
+    import us_macro_index
+    import us_pdf_report
+    import us_risk_engine
+
+    def fetch():
+        frames, _ = fred_multi.sync_all()
+        return frames
+
+    def build(raw):
+        if us_macro_build.BUILD_MODE == "incremental":
+            df = us_macro_build.build_incremental_from_disk(raw)
+        else:
+            df = us_macro_build.build_dataset(raw)
+        us_macro_build.save_dataset(df)
+        return df
+
+    def risk(monthly):
+        df = us_risk_engine.score_risk(monthly)
+        us_risk_engine.save_risk(df)
+        return df
+
+    def sql(risk):
+        return sql_store_and_query.store_and_query(risk)
+
+    def store(raw, index, forecast):
+        # Raw observations, index and forecast into SQLite for the reports and ad-hoc queries
+        for result in (sql_store.store_observations(raw), sql_store.store_index(index),
+                       sql_store.store_forecast(forecast)):
+            logging.info(f"SQLite {result['table']}: {result['written']} written, {result['deleted']} deleted")
+            refreshed = macro_summary.refresh(result)
+            if refreshed:
+                logging.info(f"Summaries from {result['table']} refreshed for {', '.join(refreshed)}")
+        return sql_store.DB_PATH
+
+    def index(risk):
+        df = us_macro_index.build_index(risk)
+        top_high, top_low = us_macro_index.top_periods(df)
+        us_macro_index.save_index(df, top_high, top_low)
+        return df, top_high, top_low
+
+    def forecast(index):
+        fc = stress_forecast.forecast(index)
+        us_macro_index.save_forecast(fc)
+        return fc
+
+    def scenarios(risk):
+        cube = scenario_engine.run_scenarios(risk)
+        scenario_engine.save_scenarios(cube)
+        return cube
+
+    def charts(index, forecast):
+        # {path: content hash}, so stages reading the charts see when a picture changed
+        return chart_renderer.render_index_charts(index, forecast)
+
+    def excel(risk, index, top_high, top_low, snapshot, last12, scenarios):
+        us_excel_report.create_excel_report(risk, index, top_high, top_low, snapshot, last12, scenarios)
+        return us_excel_report.OUTPUT_FILE
+
+    def pdf(index, forecast, top_high, charts, db):
+        us_pdf_report.make_pdf(index, forecast, top_high)
+        return us_pdf_report.OUTPUT_FILE
+
+    def tables(*names):
+        # SQLite tables a stage writes; a cached run is only reused while they are all there
+        return tuple((sql_store.DB_PATH, name) for name in names)
+
+    return Pipeline([
+        Stage("fetch", fetch, outputs=("raw",), cache=False),
+        Stage("build", build, ("raw",), ("monthly",), code=(us_macro_build,),
+              writes=(f"{us_macro_build.OUT_PATH}/macro_us_monthly.csv",)
+              + ((us_macro_build.FEATURE_STATE_PATH,) if us_macro_build.BUILD_MODE == "incremental" else ())),
+        Stage("risk", risk, ("monthly",), ("risk",), code=(us_risk_engine, risk_rules), files=(risk_rules.RULES_PATH,),
+              writes=(f"{us_risk_engine.OUT_PATH}/macro_us_with_risk.csv",)),
+        Stage("sql", sql, ("risk",), ("snapshot", "last12"), code=(sql_store_and_query, sql_store, macro_summary),
+              writes=tables("macro_risk", "macro_us", "summary_snapshot", "summary_last12")
+              + ("../data/processed/sql_snapshot.csv", "../data/processed/sql_last12.csv")),
+        Stage("index", index, ("risk",), ("index", "top_high", "top_low"), code=(us_macro_index,),
+              version=f"1-{us_macro_index.ZSCORE_MODE}-{us_macro_index.ZSCORE_WINDOW}",
+              writes=tuple(f"{us_macro_index.OUT_PATH}/{name}.csv"
+                           for name in ("macro_us_with_index", "top_high_stress_periods", "top_low_stress_periods"))),
+        Stage("forecast", forecast, ("index",), ("forecast",), code=(us_macro_index, stress_forecast),
+              version=f"1-{stress_forecast.METHOD}-{stress_forecast.HORIZON}-{stress_forecast.PATHS}-{stress_forecast.SEED}",
+              writes=(f"{us_macro_index.OUT_PATH}/macro_us_index_forecast.csv",)),
+        Stage("store", store, ("raw", "index", "forecast"), ("db",), code=(sql_store, macro_summary),
+              writes=tables("observations", "macro_index", "macro_forecast", "stress_rank", "summary_regime")),
+        Stage("scenarios", scenarios, ("risk",), ("scenarios",), code=(scenario_engine, us_macro_index, risk_rules),
+              files=(risk_rules.RULES_PATH, scenario_engine.SCENARIOS_PATH),
+              version=f"1-{us_macro_index.ZSCORE_MODE}-{us_macro_index.ZSCORE_WINDOW}-{scenario_engine.SCENARIO_MONTHS}",
+              writes=(f"{scenario_engine.OUT_PATH}/scenario_cube.csv",)),
+        # Always runs: the renderer keeps its own content-hash cache and redraws only changed charts
+        Stage("charts", charts, ("index", "forecast"), ("charts",), cache=False),
+        Stage("excel", excel, ("risk", "index", "top_high", "top_low", "snapshot", "last12", "scenarios"), ("excel",),
+              code=(us_excel_report,)),
+        Stage("pdf", pdf, ("index", "forecast", "top_high", "charts", "db"), ("pdf",), code=(us_pdf_report,)),
+    ])
+
+def run_inprocess():
+    try:
+        _, timings = build_pipeline().run()
+    except StageFailed as e:
+        print(f"❌ Error in {e.stage}: {e.error}")
+        sys.exit(1)
+    print("\n" + format_timings(timings))
+
 if __name__ == "__main__":
-    for s in scripts:
-        run_script(s)
+    with instrumentation.span("pipeline", mode=PIPELINE_MODE):
+        if PIPELINE_MODE == "subprocess":
+            for s in scripts:
+                run_script(s)
+        else:
+            run_inprocess()
+    profile = instrumentation.dump_profile()
+    if profile:
+        logging.info(f"Profile written to {profile}")
+        print(f"🔥 Profile: {profile}")
+    logging.info(f"Metrics for run {instrumentation.RUN_ID} appended to {instrumentation.METRICS_PATH}")
+
+    # Tell running API servers (serve_api.py) that a new set of results is complete
+    import serve_api
+    version = serve_api.publish()
+    logging.info(f"Published results version {version}")
 
     print("\n🎯 FULL PIPELINE EXECUTED SUCCESSFULLY")
     logging.info("FULL PIPELINE EXECUTED SUCCESSFULLY")
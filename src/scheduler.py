@@ -0,0 +1,253 @@
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+import pandas as pd
+
+import fred_cache
+import fred_client
+import fred_multi
+import instrumentation
+import serve_api
+from pipeline import format_timings
+from run_pipeline import build_pipeline
+
+# Resident refresh loop: one long-lived process that keeps the interpreter, the imports and the
+# last run's artifacts in memory, and re-runs the pipeline only when FRED releases new data.
+#   python scheduler.py          run until SIGTERM / Ctrl-C
+#   python scheduler.py --once   one check (and refresh if anything changed), then exit
+#
+# Each series' /series metadata (last_updated) is polled: every POLL_SECONDS, or, for series
+# on the release calendar, from each scheduled release until the new data shows up. Releases
+# seen within DEBOUNCE_SECONDS of each other (CPI and friends come out together) are
+# coalesced into one refresh, delayed by at most MAX_DELAY_SECONDS. A refresh re-syncs only
+# the released series and re-runs the stages downstream of the raw data, from the in-memory
+# artifacts; the stage cache skips any whose inputs did not change. Progress is checkpointed
+# to STATE_PATH, so a restart picks up releases that were seen but not yet processed.
+POLL_SECONDS = float(os.getenv("MACRO_SCHEDULER_POLL", "900"))
+DEBOUNCE_SECONDS = float(os.getenv("MACRO_SCHEDULER_DEBOUNCE", "60"))
+MAX_DELAY_SECONDS = float(os.getenv("MACRO_SCHEDULER_MAX_DELAY", "600"))
+RELEASE_POLL_SECONDS = float(os.getenv("MACRO_SCHEDULER_RELEASE_POLL", "60"))  # awaiting a scheduled release
+RELEASE_WINDOW_SECONDS = float(os.getenv("MACRO_SCHEDULER_RELEASE_WINDOW", str(2 * 3600)))
+CALENDAR_POLL_SECONDS = float(os.getenv("MACRO_SCHEDULER_CALENDAR_POLL", str(24 * 3600)))  # catches unscheduled revisions
+RETRY_SECONDS = float(os.getenv("MACRO_SCHEDULER_RETRY", "300"))               # after a failed refresh
+# {series name: [release times]}, as a JSON file or URL (e.g. the stub's /stub/calendar);
+# times without a UTC offset are read as UTC
+CALENDAR = os.getenv("MACRO_RELEASE_CALENDAR", "../config/release_calendar.json")
+STATE_PATH = os.getenv("MACRO_SCHEDULER_STATE", "../data/processed/scheduler_state.json")
+
+logger = logging.getLogger("scheduler")
+
+def epoch(value) -> float:
+    ts = pd.Timestamp(value)
+    return (ts if ts.tzinfo else ts.tz_localize("UTC")).timestamp()
+
+def load_calendar(source: str = CALENDAR) -> dict:
+    # {series name: sorted release times (epoch seconds)}; empty when there is no calendar
+    try:
+        if source.startswith(("http://", "https://")):
+            raw = fred_client.get_session().get(source, timeout=30).json()
+        elif os.path.exists(source):
+            with open(source) as f:
+                raw = json.load(f)
+        else:
+            return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Release calendar {source} unreadable ({e!r}); polling every series on a timer")
+        return {}
+    return {name: sorted(epoch(t) for t in times) for name, times in raw.items()}
+
+def load_state(path: str = STATE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {"series": {}, "pending": {}, "refreshes": 0, "last_refresh": None}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(state: dict, path: str = STATE_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+class Scheduler:
+    def __init__(self, series: dict = fred_multi.SERIES, calendar: dict = None, state_path: str = STATE_PATH):
+        self.series = series
+        self.calendar = load_calendar() if calendar is None else calendar
+        self.state_path = state_path
+        self.state = load_state(state_path)
+        self.pipeline = build_pipeline()
+        self.artifacts = None          # last run's outputs, kept warm between refreshes
+        self.stop = threading.Event()
+        self.first_change = self.last_change = None
+        self.last_sweep = 0.0
+        self.retry_at = 0.0
+        # The metadata poll decides when to fetch, so fetched responses are always revalidated
+        fred_cache.CACHE.ttl = 0
+
+    def next_poll(self, name: str) -> float:
+        info = self.state["series"].get(name, {})
+        checked = info.get("checked", 0.0)
+        times = self.calendar.get(name)
+        if not times:
+            return checked + POLL_SECONDS
+        now = time.time()
+        seen = epoch(info["last_updated"]) if info.get("last_updated") else 0.0
+        passed = [t for t in times if t <= now]
+        if passed and passed[-1] > seen and now - passed[-1] < RELEASE_WINDOW_SECONDS:
+            return max(checked + RELEASE_POLL_SECONDS, passed[-1])   # scheduled, not out yet
+        upcoming = [t for t in times if t > checked]
+        return min(upcoming[0] if upcoming else float("inf"), checked + CALENDAR_POLL_SECONDS)
+
+    def poll(self, name: str) -> None:
+        now = time.time()
+        info = self.state["series"].setdefault(name, {})
+        try:
+            updated = fred_client.fetch_series_info(self.series[name])["last_updated"]
+        except Exception as e:
+            logger.warning(f"Release check failed for {name}: {e!r}")
+            info["checked"] = now - max(POLL_SECONDS - RELEASE_POLL_SECONDS, 0)  # retry soon
+            return
+        info["checked"] = now
+        if updated != info.get("last_updated") and updated != self.state["pending"].get(name):
+            logger.info(f"Release detected: {name} ({self.series[name]}) updated {updated}")
+            print(f"📣 {name}: new release ({updated})")
+            self.state["pending"][name] = updated
+            self.first_change = self.first_change or now
+            self.last_change = now
+
+    def poll_all(self) -> None:
+        for name in self.series:
+            self.poll(name)
+        self.first_change = self.last_change = None   # nothing to wait for: refresh right away
+
+    def poll_due(self) -> None:
+        now = time.time()
+        # While a burst is being collected, every series is checked twice per debounce window
+        sweep = bool(self.state["pending"]) and now >= self.retry_at and now - self.last_sweep >= DEBOUNCE_SECONDS / 2
+        if sweep:
+            self.last_sweep = now
+        for name in self.series:
+            if sweep or self.next_poll(name) <= now:
+                self.poll(name)
+
+    def ready(self) -> bool:
+        now = time.time()
+        if not self.state["pending"] or now < self.retry_at:
+            return False
+        if self.first_change is None:      # found by poll_all or carried over from the checkpoint
+            return True
+        return now - self.last_change >= DEBOUNCE_SECONDS or now - self.first_change >= MAX_DELAY_SECONDS
+
+    def refresh(self) -> bool:
+        # Full run on the first refresh; afterwards re-sync the released series and re-run the
+        # stages downstream of the raw data from the warm artifacts
+        pending = dict(self.state["pending"])
+        t0 = time.perf_counter()
+        try:
+            with instrumentation.span("scheduler.refresh", series=sorted(pending), warm=self.artifacts is not None):
+                if self.artifacts is None:
+                    artifacts, timings = self.pipeline.run()
+                else:
+                    frames, _ = fred_multi.sync_all({n: self.series[n] for n in pending})
+                    previous = self.artifacts["raw"]
+                    changed = [n for n, df in frames.items() if n not in previous or not df.equals(previous[n])]
+                    if not changed:
+                        logger.info(f"Releases of {', '.join(pending)} brought no new observations")
+                        print(f"✅ No new observations in {', '.join(pending)}; outputs unchanged")
+                        artifacts, timings = self.artifacts, []
+                    else:
+                        consumers = [n for n, s in self.pipeline.stages.items() if "raw" in s.inputs]
+                        stages = self.pipeline.downstream(consumers)
+                        logger.info(f"Refreshing {sorted(stages)} for {', '.join(changed)}")
+                        outputs, timings = self.pipeline.run({"raw": {**previous, **frames}}, only=stages)
+                        artifacts = {**self.artifacts, **outputs}
+        except Exception as e:
+            # StageFailed, or the sync of a released series; the daemon keeps running
+            logger.error(f"Refresh failed: {e!r}")
+            print(f"❌ Refresh failed: {e} (retrying in {RETRY_SECONDS:.0f}s)")
+            self.retry_at = time.time() + RETRY_SECONDS
+            self.checkpoint()
+            return False
+        finally:
+            if self.pipeline.cache is not None:
+                self.pipeline.cache.reset()
+
+        self.artifacts = artifacts
+        for name, updated in pending.items():
+            self.state["series"].setdefault(name, {})["last_updated"] = updated
+            del self.state["pending"][name]
+        self.first_change = self.last_change = None
+        self.state["refreshes"] += 1
+        self.state["last_refresh"] = {"at": pd.Timestamp.now().isoformat(timespec="seconds"),
+                                      "series": sorted(pending), "seconds": round(time.perf_counter() - t0, 3)}
+        self.checkpoint()
+        if timings:
+            print(format_timings(timings))
+            version = serve_api.publish()
+            logger.info(f"Published results version {version}")
+        print(f"🎯 Refresh {self.state['refreshes']} done in {time.perf_counter() - t0:.2f}s")
+        return True
+
+    def checkpoint(self) -> None:
+        save_state(self.state, self.state_path)
+
+    def sleep_time(self) -> float:
+        now = time.time()
+        wake = min(self.next_poll(n) for n in self.series)
+        if self.state["pending"]:
+            if self.retry_at > now:
+                wake = min(wake, self.retry_at)
+            else:
+                wake = min(wake, self.last_sweep + DEBOUNCE_SECONDS / 2)
+                if self.first_change is not None:
+                    wake = min(wake, self.last_change + DEBOUNCE_SECONDS, self.first_change + MAX_DELAY_SECONDS)
+        return min(max(wake - now, 0.5), POLL_SECONDS)
+
+    def run(self) -> None:
+        # Learn every series' last_updated, build everything once (warming the artifacts), then
+        # refresh on releases until stopped
+        self.poll_all()
+        self.refresh()
+        while not self.stop.is_set():
+            self.stop.wait(self.sleep_time())
+            if self.stop.is_set():
+                break
+            self.poll_due()
+            if self.ready():
+                self.refresh()
+        self.checkpoint()
+        logger.info("Scheduler stopped")
+        print("👋 Scheduler stopped; state saved to", self.state_path)
+
+    def once(self) -> bool:
+        # One check of every series; a full run only if something was released since last time
+        self.poll_all()
+        if not self.state["pending"]:
+            self.checkpoint()
+            print("✅ No new releases")
+            return False
+        return self.refresh()
+
+    def shutdown(self, signum=None, frame=None) -> None:
+        # Signal handler: a running refresh completes, then the loop exits and checkpoints
+        if not self.stop.is_set():
+            logger.info(f"Shutdown requested (signal {signum})")
+            print("🛑 Shutting down after the current step...")
+        self.stop.set()
+
+if __name__ == "__main__":
+    scheduler = Scheduler()
+    signal.signal(signal.SIGTERM, scheduler.shutdown)
+    signal.signal(signal.SIGINT, scheduler.shutdown)
+    calendar = ", ".join(f"{n} ({len(t)})" for n, t in scheduler.calendar.items()) or "none"
+    print(f"⏰ Scheduler: {len(scheduler.series)} series, poll every {POLL_SECONDS:.0f}s, "
+          f"debounce {DEBOUNCE_SECONDS:.0f}s, calendar: {calendar}")
+    if sys.argv[1:] == ["--once"]:
+        scheduler.once()
+    else:
+        scheduler.run()
@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from storage import exists, load_frame
+
+# Local JSON API over the latest published results, for dashboards:
+#   GET /latest              latest month's risk level, stress index, regime, strategy and forecast
+#   GET /history?months=N    the last N months (at most HISTORY_MONTHS)
+#   GET /forecast            forecast path with its quantile bands
+#   GET /health              published version and when it was loaded
+# Responses are serialized once per publish and kept in memory. The pipeline writes
+# PUBLISH_PATH after each successful run; the server re-reads the data only when that marker
+# changes. Every response carries an ETag (the publish version), so a client repeating a GET
+# with If-None-Match gets an empty 304 until new results land.
+HOST = os.getenv("MACRO_API_HOST", "127.0.0.1")
+PORT = int(os.getenv("MACRO_API_PORT", "8780"))
+INDEX_PATH = "../data/processed/macro_us_with_index.csv"
+FORECAST_PATH = "../data/processed/macro_us_index_forecast.csv"
+PUBLISH_PATH = "../data/processed/published.json"
+HISTORY_MONTHS = int(os.getenv("MACRO_API_HISTORY_MONTHS", "120"))
+DEFAULT_MONTHS = 12
+
+LATEST_FIELDS = ["date", "risk_level", "risk_score", "alerts", "macro_stress_index", "stress_level", "macro_strategy"]
+HISTORY_FIELDS = ["date", "us_cpi_yoy_pct", "us_unrate", "us_fedfunds", "us_10y", "risk_score", "risk_level",
+                  "macro_stress_index", "stress_level"]
+
+def publish(path: str = PUBLISH_PATH) -> str:
+    # Mark the processed files as a new consistent release; servers pick it up on their next request
+    version = f"{time.time_ns():x}"
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": version, "published_at": pd.Timestamp.now().isoformat(timespec="seconds")}, f)
+    os.replace(tmp, path)
+    return version
+
+def to_records(df: pd.DataFrame, fields: list) -> list:
+    # JSON-ready rows: ISO dates, NaN -> null, numpy scalars -> Python
+    df = df[[c for c in fields if c in df.columns]].copy()
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+def encode(payload) -> bytes:
+    return json.dumps(payload, default=lambda v: v.item() if isinstance(v, np.generic) else str(v)).encode()
+
+class Release:
+    # One published state, fully serialized; never modified once built
+    def __init__(self, version: str, latest: dict, history: list, forecast: list):
+        self.version = version
+        self.history = history
+        loaded_at = pd.Timestamp.now().isoformat(timespec="seconds")
+        self.bodies = {
+            "/latest": encode({"version": version, **latest, "forecast": forecast}),
+            "/forecast": encode({"version": version, "forecast": forecast}),
+            "/history": self.history_body(DEFAULT_MONTHS),
+            "/health": encode({"version": version, "loaded_at": loaded_at, "months": len(history)}),
+        }
+
+    def history_body(self, months: int) -> bytes:
+        rows = self.history[-months:] if months > 0 else []
+        return encode({"version": self.version, "months": len(rows), "history": rows})
+
+    def body(self, path: str, months: int = None):
+        if path == "/history" and months not in (None, DEFAULT_MONTHS):
+            return self.history_body(months)
+        return self.bodies.get(path)
+
+class ApiState:
+    # Holds the current Release and swaps in a new one when the publish marker changes
+    def __init__(self, index_path: str = INDEX_PATH, forecast_path: str = FORECAST_PATH,
+                 publish_path: str = PUBLISH_PATH):
+        self.index_path = index_path
+        self.forecast_path = forecast_path
+        self.publish_path = publish_path
+        self.lock = threading.Lock()
+        self.marker = None
+        self.release = None
+
+    def marker_key(self):
+        try:
+            st = os.stat(self.publish_path)
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def current(self) -> Release:
+        # One stat per request; the files are re-read only when the marker moved
+        key = self.marker_key()
+        if self.release is None or key != self.marker:
+            with self.lock:
+                if self.release is None or key != self.marker:
+                    self.release, self.marker = self.load(key), key
+        return self.release
+
+    def load(self, key) -> Release:
+        version = "unpublished"
+        if key is not None:
+            with open(self.publish_path) as f:
+                version = json.load(f)["version"]
+        df = load_frame(self.index_path).sort_values("date").tail(HISTORY_MONTHS)
+        fc = load_frame(self.forecast_path) if exists(self.forecast_path) else pd.DataFrame()
+        latest = to_records(df.tail(1), LATEST_FIELDS)[0] if not df.empty else {}
+        forecast = to_records(fc, list(fc.columns)) if not fc.empty else []
+        return Release(version, latest, to_records(df, HISTORY_FIELDS), forecast)
+
+def make_handler(state: ApiState):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, so a dashboard polling the API reuses its connection; without Nagle the
+        # body is not held back waiting for the ACK of the headers
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def send_body(self, status, body, etag=None):
+            self.send_response(status)
+            if etag:
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+            if body is None:
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            months = None
+            if url.path == "/history" and "months" in q:
+                try:
+                    months = min(int(q["months"]), HISTORY_MONTHS)
+                except ValueError:
+                    return self.send_body(400, encode({"error": "months must be an integer"}))
+
+            current = state.current()
+            variant = url.path.strip("/") + (f"-{months}" if months is not None else "")
+            etag = f'"{current.version}-{variant}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self.send_body(304, None, etag)
+            body = current.body(url.path, months)
+            if body is None:
+                return self.send_body(404, encode({"error": f"Unknown path {url.path}"}))
+            self.send_body(200, body, etag)
+
+    return Handler
+
+def serve(host: str = HOST, port: int = PORT, state: ApiState = None) -> ThreadingHTTPServer:
+    # Returns a bound server; call serve_forever() (or run it in a thread)
+    server = ThreadingHTTPServer((host, port), make_handler(state or ApiState()))
+    server.daemon_threads = True
+    return server
+
+if __name__ == "__main__":
+    state = ApiState()
+    server = serve(state=state)
+    print(f"✅ Macro API serving version {state.current().version} on http://{HOST}:{server.server_port} "
+          f"(/latest, /history, /forecast, /health)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,187 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrument
+
+# Persistent SQLite store for the processed tables. Rows are keyed by (country, date), written
+# with executemany upserts of only the rows whose contents changed (tracked by a row hash),
+# and read back by the reports. One WAL-mode connection is kept per thread and database.
+DB_PATH = os.getenv("MACRO_DB_PATH", "../data/processed/macro.db")
+DEFAULT_COUNTRY = "us"
+
+# table -> (primary key, secondary indexes); an index is a column or a tuple of columns
+TABLES = {
+    "macro_risk": (("country", "date"), ("date", "risk_level")),
+    "macro_index": (("country", "date"), ("date", "stress_level", ("country", "macro_stress_index"))),
+    "macro_forecast": (("country", "date"), ()),
+    "observations": (("country", "series", "date"), ("date",)),
+}
+# Existing queries read the US risk panel as macro_us
+VIEWS = {
+    "macro_us": f"SELECT * FROM macro_risk WHERE country = '{DEFAULT_COUNTRY}'",
+}
+INDEX_COLUMNS = ["date", "z_cpi", "z_unrate", "z_fedfunds", "z_10y",
+                 "macro_stress_index", "stress_level", "macro_strategy"]
+
+_local = threading.local()
+
+def get_connection(path: str = DB_PATH) -> sqlite3.Connection:
+    # Pooled per-thread connection; WAL lets report readers run while the pipeline writes
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conns[path] = conn
+    return conn
+
+def close_connections() -> None:
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
+
+def sql_type(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+def table_columns(conn: sqlite3.Connection, table: str) -> list:
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+
+def ensure_table(conn: sqlite3.Connection, table: str, df: pd.DataFrame) -> None:
+    # Create the table (and its indexes) on first use; add columns that appeared since
+    key, indexes = TABLES[table]
+    existing = table_columns(conn, table)
+    if not existing:
+        cols = ", ".join(f'"{c}" {sql_type(df[c].dtype)}' for c in df.columns)
+        conn.execute(f'CREATE TABLE "{table}" ({cols}, row_hash INTEGER, '
+                     f'PRIMARY KEY ({", ".join(key)})) WITHOUT ROWID')
+        for cols in indexes:
+            cols = (cols,) if isinstance(cols, str) else cols
+            quoted = ", ".join(f'"{c}"' for c in cols)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_{"_".join(cols)}" ON "{table}" ({quoted})')
+    else:
+        for c in df.columns:
+            if c not in existing:
+                conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{c}" {sql_type(df[c].dtype)}')
+    for view, query in VIEWS.items():
+        if table in query:
+            # A pre-store database may still hold macro_us as a plain to_sql table; it is only
+            # dropped here, as the view replacing it is created
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (view,)).fetchone():
+                conn.execute(f'DROP TABLE "{view}"')
+            conn.execute(f'CREATE VIEW IF NOT EXISTS "{view}" AS {query}')
+
+def to_records(df: pd.DataFrame) -> pd.DataFrame:
+    # SQLite-friendly copy: ISO date strings, NaN -> NULL, numpy scalars -> Python
+    df = df.copy()
+    for c in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[c]):
+            df[c] = df[c].dt.strftime("%Y-%m-%d")
+    return df.astype(object).where(df.notna(), None)
+
+@instrument()
+def upsert(table: str, df: pd.DataFrame, country: str = DEFAULT_COUNTRY, path: str = DB_PATH,
+           prune: bool = True) -> dict:
+    # Write df into `table` as the current contents for `country`: new and changed rows are
+    # upserted, unchanged rows are left alone, and (with prune) rows no longer in df are deleted.
+    # Returns row counts, the countries written and the subset whose rows changed.
+    key, _ = TABLES[table]
+    df = df.copy()
+    if "country" not in df.columns:
+        df.insert(0, "country", country)
+    df["row_hash"] = pd.util.hash_pandas_object(df, index=False).to_numpy().view(np.int64)
+    records = to_records(df)
+
+    conn = get_connection(path)
+    with conn:
+        ensure_table(conn, table, df.drop(columns="row_hash"))
+        countries = list(records["country"].unique())
+        stored = pd.read_sql_query(
+            f'SELECT {", ".join(key)}, row_hash FROM "{table}" WHERE country IN ({",".join("?" * len(countries))})',
+            conn, params=countries)
+        keys = records[list(key)].astype(str)
+        stored[list(key)] = stored[list(key)].astype(str)
+
+        seen = keys.assign(new_hash=df["row_hash"].to_numpy()).merge(stored, on=list(key), how="left")
+        rows = records[(seen["row_hash"] != seen["new_hash"]).to_numpy()]
+
+        cols = list(records.columns)
+        quoted = ", ".join(f'"{c}"' for c in cols)
+        updates = ", ".join(f'"{c}" = excluded."{c}"' for c in cols if c not in key)
+        conn.executemany(
+            f'INSERT INTO "{table}" ({quoted}) VALUES ({",".join("?" * len(cols))}) '
+            f'ON CONFLICT ({", ".join(key)}) DO UPDATE SET {updates}',
+            rows.itertuples(index=False, name=None),
+        )
+
+        deleted, gone = 0, stored.iloc[:0]
+        if prune:
+            gone = stored.merge(keys, on=list(key), how="left", indicator=True)
+            gone = gone.loc[gone["_merge"] == "left_only", list(key)]
+            conn.executemany(
+                f'DELETE FROM "{table}" WHERE {" AND ".join(f"{k} = ?" for k in key)}',
+                gone.itertuples(index=False, name=None),
+            )
+            deleted = len(gone)
+        changed = set(rows["country"]) | set(gone["country"])
+    return {"table": table, "rows": len(records), "written": len(rows), "deleted": deleted,
+            "countries": countries, "changed": changed}
+
+def store_risk(df: pd.DataFrame, country: str = DEFAULT_COUNTRY, path: str = DB_PATH) -> dict:
+    return upsert("macro_risk", df, country, path)
+
+def store_index(df: pd.DataFrame, country: str = DEFAULT_COUNTRY, path: str = DB_PATH) -> dict:
+    return upsert("macro_index", df[[c for c in INDEX_COLUMNS if c in df.columns]], country, path)
+
+def store_forecast(df: pd.DataFrame, country: str = DEFAULT_COUNTRY, path: str = DB_PATH) -> dict:
+    return upsert("macro_forecast", df, country, path)
+
+def store_observations(frames: dict, country: str = DEFAULT_COUNTRY, path: str = DB_PATH) -> dict:
+    # frames: raw {series name: df with date/value} as fetched by fred_multi
+    long = pd.concat(
+        [f[["date", "value"]].assign(series=name) for name, f in frames.items()], ignore_index=True
+    )[["series", "date", "value"]]
+    return upsert("observations", long, country, path)
+
+def query(sql: str, params=(), path: str = DB_PATH) -> pd.DataFrame:
+    df = pd.read_sql_query(sql, get_connection(path), params=params)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+    return df
+
+def has_table(table: str, path: str = DB_PATH) -> bool:
+    if not os.path.exists(path):
+        return False
+    row = get_connection(path).execute(
+        "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", (table,)).fetchone()
+    return row is not None
+
+def load_table(table: str, country: str = DEFAULT_COUNTRY, path: str = DB_PATH):
+    # A stored table for one country, date-ordered, without the store's bookkeeping columns;
+    # None when the database does not have it yet
+    if not has_table(table, path):
+        return None
+    df = query(f'SELECT * FROM "{table}" WHERE country = ? ORDER BY date', (country,), path)
+    if df.empty:
+        return None
+    return df.drop(columns=["country", "row_hash"])
+
+def top_periods(n: int = 10, ascending: bool = False, country: str = DEFAULT_COUNTRY, path: str = DB_PATH):
+    # Highest (or lowest) stress months, served by the macro_stress_index index
+    if not has_table("macro_index", path):
+        return None
+    order = "ASC" if ascending else "DESC"
+    return query(f'SELECT date, macro_stress_index, stress_level FROM macro_index WHERE country = ? '
+                 f'AND macro_stress_index IS NOT NULL ORDER BY macro_stress_index {order} LIMIT ?',
+                 (country, n), path)
@@ -1,50 +1,29 @@
-import os
-import sqlite3
 import pandas as pd
 
+import macro_summary
+import sql_store
+from sql_store import DB_PATH
+from storage import load_frame, save_frame
+
 CSV_PATH = "../data/processed/macro_us_with_risk.csv"
-DB_PATH = "../data/processed/macro.db"
+
+def store_and_query(df: pd.DataFrame):
+    # Upsert the risk panel into SQLite and run the executive queries; returns (snapshot, last12)
+    result = sql_store.store_risk(df)
+    print(f"✅ SQLite macro_risk: {result['written']} row(s) written, {result['deleted']} deleted, "
+          f"{result['rows'] - result['written']} unchanged")
+    macro_summary.refresh(result)
+
+    # Executive snapshot and last 12 months, maintained as summary tables (see macro_summary)
+    snap = macro_summary.snapshot()
+    last12 = macro_summary.last12()
+
+    save_frame(snap, "../data/processed/sql_snapshot.csv")
+    save_frame(last12, "../data/processed/sql_last12.csv")
+    return snap, last12
 
 def main():
-    os.makedirs("../data/processed", exist_ok=True)
-
-    df = pd.read_csv(CSV_PATH)
-    df["date"] = pd.to_datetime(df["date"])
-
-    conn = sqlite3.connect(DB_PATH)
-
-    df.to_sql("macro_us", conn, if_exists="replace", index=False)
-
-    q_snapshot = """
-    SELECT date, risk_level, risk_score, alerts,
-           ROUND(us_cpi_yoy_pct,2) AS cpi_yoy_pct,
-           ROUND(us_unrate,2) AS unrate,
-           ROUND(us_fedfunds,2) AS fedfunds,
-           ROUND(us_10y,2) AS us10y
-    FROM macro_us
-    ORDER BY date DESC
-    LIMIT 1;
-    """
-    snap = pd.read_sql_query(q_snapshot, conn)
-
-    q_last12 = """
-    SELECT date,
-           ROUND(us_cpi_yoy_pct,2) AS cpi_yoy_pct,
-           ROUND(us_unrate,2) AS unrate,
-           ROUND(us_fedfunds,2) AS fedfunds,
-           ROUND(us_10y,2) AS us10y,
-           risk_level,
-           risk_score
-    FROM macro_us
-    ORDER BY date DESC
-    LIMIT 12;
-    """
-    last12 = pd.read_sql_query(q_last12, conn)
-
-    conn.close()
-
-    snap.to_csv("../data/processed/sql_snapshot.csv", index=False)
-    last12.to_csv("../data/processed/sql_last12.csv", index=False)
+    store_and_query(load_frame(CSV_PATH))
 
     print("✅ SQLite DB:", DB_PATH)
     print("✅ SQL outputs:")
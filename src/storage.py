@@ -0,0 +1,93 @@
+import os
+
+import pandas as pd
+
+from instrumentation import add as count_io, instrument
+
+# Storage backend for the hand-offs between pipeline stages.
+# Frames are written in a typed columnar format (dates stay datetime64, no re-parsing on read)
+# and, by default, also exported as CSV for people and tools that expect the old files.
+# Paths are given the way the scripts always named them ("../data/processed/x.csv"); the
+# extension is swapped for the active backend.
+STORAGE_FORMAT = os.getenv("MACRO_STORAGE_FORMAT", "parquet")  # parquet | feather | csv
+EXPORT_CSV = os.getenv("MACRO_EXPORT_CSV", "1").lower() not in ("0", "false", "no")
+PARQUET_COMPRESSION = os.getenv("MACRO_PARQUET_COMPRESSION", "zstd")
+DATE_COLUMNS = ("date",)
+
+EXTENSIONS = {"parquet": ".parquet", "feather": ".arrow", "csv": ".csv"}
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+def resolve_format(fmt: str = None) -> str:
+    fmt = fmt or STORAGE_FORMAT
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"storage format must be one of {sorted(EXTENSIONS)}, got {fmt!r}")
+    if fmt != "csv" and not HAS_ARROW:
+        return "csv"
+    return fmt
+
+def stem(path: str) -> str:
+    base, ext = os.path.splitext(path)
+    return base if ext in EXTENSIONS.values() else path
+
+def path_for(path: str, fmt: str = None) -> str:
+    return stem(path) + EXTENSIONS[resolve_format(fmt)]
+
+@instrument()
+def save_frame(df: pd.DataFrame, path: str, fmt: str = None, export_csv: bool = EXPORT_CSV) -> str:
+    fmt = resolve_format(fmt)
+    out = path_for(path, fmt)
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+
+    # Export first so the primary copy is always the newest (see _newest)
+    if export_csv and fmt != "csv":
+        df.to_csv(path_for(path, "csv"), index=False)
+        count_io(bytes_written=os.path.getsize(path_for(path, "csv")))
+
+    if fmt == "parquet":
+        df.to_parquet(out, index=False, compression=PARQUET_COMPRESSION)
+    elif fmt == "feather":
+        # Uncompressed Arrow IPC so readers can memory-map it
+        df.reset_index(drop=True).to_feather(out, compression="uncompressed")
+    else:
+        df.to_csv(out, index=False)
+    count_io(bytes_written=os.path.getsize(out), rows=len(df))
+    return out
+
+def exists(path: str) -> bool:
+    return any(os.path.exists(stem(path) + ext) for ext in EXTENSIONS.values())
+
+def _newest(path: str):
+    # The most recently written copy wins, so a CSV edited (or appended to) by hand is never shadowed
+    found = []
+    for fmt, ext in EXTENSIONS.items():
+        p = stem(path) + ext
+        if os.path.exists(p) and (fmt == "csv" or HAS_ARROW):
+            found.append((os.path.getmtime(p), fmt != "csv", fmt, p))
+    if not found:
+        raise FileNotFoundError(f"No stored frame for {stem(path)} ({', '.join(EXTENSIONS.values())})")
+    _, _, fmt, p = max(found)
+    return fmt, p
+
+@instrument()
+def load_frame(path: str, columns: list = None) -> pd.DataFrame:
+    fmt, p = _newest(path)
+    count_io(bytes_read=os.path.getsize(p))
+    if fmt == "parquet":
+        return pd.read_parquet(p, columns=columns, memory_map=True)
+    if fmt == "feather":
+        from pyarrow import feather
+        return feather.read_table(p, columns=columns, memory_map=True).to_pandas()
+
+    df = pd.read_csv(p, usecols=columns)
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+def load_optional(path: str, columns: list = None):
+    return load_frame(path, columns) if exists(path) else None
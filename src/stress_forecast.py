@@ -0,0 +1,108 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from storage import load_frame
+
+# Probabilistic stress index forecasts. Each method turns the index history into an
+# (paths x horizon) array of simulated future values in one vectorized step:
+#   ar1       - AR(1) fitted on the last FIT_WINDOW months, Gaussian innovations
+#   bootstrap - moving-block bootstrap of historical monthly changes
+#   trend     - the original single linear-trend line (no bands)
+DATA_PATH = "../data/processed/macro_us_with_index.csv"
+METHOD = os.getenv("MACRO_FORECAST_METHOD", "ar1")
+HORIZON = int(os.getenv("MACRO_FORECAST_HORIZON", "3"))      # months ahead (3-12)
+PATHS = int(os.getenv("MACRO_FORECAST_PATHS", "10000"))
+FIT_WINDOW = int(os.getenv("MACRO_FORECAST_FIT_WINDOW", "120"))
+BLOCK_SIZE = int(os.getenv("MACRO_FORECAST_BLOCK", "6"))
+SEED = int(os.getenv("MACRO_FORECAST_SEED", "42"))           # fixed so reruns (and the stage cache) agree
+WORKERS = int(os.getenv("MACRO_FORECAST_WORKERS", "1"))      # >1 shards paths over processes
+QUANTILES = {"q05": 0.05, "q25": 0.25, "q50": 0.50, "q75": 0.75, "q95": 0.95}
+
+def fit_ar1(history: np.ndarray):
+    # Least-squares x_t = c + phi * x_{t-1} + e_t; returns (c, phi, residual std)
+    x_prev, x_next = history[:-1], history[1:]
+    X = np.column_stack([np.ones(len(x_prev)), x_prev])
+    (c, phi), *_ = np.linalg.lstsq(X, x_next, rcond=None)
+    resid = x_next - X @ np.array([c, phi])
+    return float(c), float(phi), float(resid.std(ddof=2))
+
+def simulate_ar1(history: np.ndarray, horizon: int, paths: int, rng: np.random.Generator) -> np.ndarray:
+    # x_h = phi^h x_0 + c (1 + ... + phi^(h-1)) + sum_j phi^(h-j) e_j, i.e. the whole
+    # recursion is one (paths x horizon) @ (horizon x horizon) product
+    c, phi, sigma = fit_ar1(history[-FIT_WINDOW:])
+    h = np.arange(1, horizon + 1)
+    lags = h[None, :] - h[:, None]                           # [j, h] = h - j
+    propagate = np.where(lags >= 0, phi ** np.maximum(lags, 0), 0.0)
+    drift = phi ** h * history[-1] + c * np.cumsum(phi ** (h - 1))
+    shocks = rng.standard_normal((paths, horizon)) * sigma
+    return drift + shocks @ propagate
+
+def simulate_bootstrap(history: np.ndarray, horizon: int, paths: int, rng: np.random.Generator) -> np.ndarray:
+    # Concatenated random blocks of consecutive monthly changes, cumulated from the last value
+    changes = np.diff(history)
+    block = max(1, min(BLOCK_SIZE, len(changes)))
+    n_blocks = -(-horizon // block)
+    starts = rng.integers(0, len(changes) - block + 1, size=(paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block)).reshape(paths, -1)[:, :horizon]
+    return history[-1] + np.cumsum(changes[idx], axis=1)
+
+SIMULATORS = {
+    "ar1": simulate_ar1,
+    "bootstrap": simulate_bootstrap,
+}
+
+def _simulate_shard(args):
+    method, history, horizon, paths, seed = args
+    return SIMULATORS[method](history, horizon, paths, np.random.default_rng(seed))
+
+def simulate(history, method: str = METHOD, horizon: int = HORIZON, paths: int = PATHS,
+             seed: int = SEED, workers: int = WORKERS) -> np.ndarray:
+    # (paths x horizon) simulated index values; with workers > 1 the paths are split into
+    # independently seeded shards run in a process pool
+    if method not in SIMULATORS:
+        raise ValueError(f"method must be one of {sorted(SIMULATORS)}")
+    history = np.asarray(history, dtype=float)
+    history = history[~np.isnan(history)]
+    if len(history) < 3:
+        raise ValueError("Need at least 3 index values to simulate")
+
+    if workers <= 1:
+        return SIMULATORS[method](history, horizon, paths, np.random.default_rng(seed))
+
+    sizes = [len(s) for s in np.array_split(np.arange(paths), workers) if len(s)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shards = pool.map(_simulate_shard, [(method, history, horizon, n, s) for n, s in zip(sizes, seeds)])
+        return np.vstack(list(shards))
+
+def forecast_bands(df: pd.DataFrame, method: str = METHOD, horizon: int = HORIZON, paths: int = PATHS,
+                   seed: int = SEED, workers: int = WORKERS) -> pd.DataFrame:
+    # Forecast frame: date, macro_stress_index (mean path) and the QUANTILES band columns
+    df = df.sort_values("date")
+    sims = simulate(df["macro_stress_index"].to_numpy(), method, horizon, paths, seed, workers)
+    out = pd.DataFrame({
+        "date": pd.date_range(df["date"].max() + pd.offsets.MonthBegin(1), periods=horizon, freq="MS"),
+        "macro_stress_index": sims.mean(axis=0),
+    })
+    bands = np.quantile(sims, list(QUANTILES.values()), axis=0)
+    for name, row in zip(QUANTILES, bands):
+        out[name] = row
+    return out
+
+def forecast(df: pd.DataFrame, method: str = METHOD, horizon: int = HORIZON) -> pd.DataFrame:
+    if method == "trend":
+        from us_macro_index import forecast_index
+        return forecast_index(df, periods=horizon)
+    return forecast_bands(df, method, horizon)
+
+if __name__ == "__main__":
+    df = load_frame(DATA_PATH)
+    t0 = time.perf_counter()
+    fc = forecast(df)
+    seconds = time.perf_counter() - t0
+    print(f"✅ {METHOD} forecast, {HORIZON} months, {PATHS} paths in {seconds:.3f}s")
+    print(fc.to_string(index=False))
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+import panel
+
+# Synthetic FRED-like observations for benchmarks, with no network or API key involved.
+# Each (country, indicator) series is a seeded, bounded random walk in the shape fred_client
+# returns (date + value columns), so it can go through panel.to_long and everything after it.
+END_DATE = "2025-12-01"
+YEARS = 64                      # roughly the US history (1962 onwards)
+FREQUENCIES = ("mixed", "daily", "monthly")  # mixed: daily where FRED's series is (DGS10)
+
+# indicator: (start level, drift per month, volatility per month, floor, cap, decimals)
+PROFILES = {
+    "cpi": (30.0, 0.0030, 0.0030, 1.0, None, 3),        # log walk, always positive
+    "unrate": (5.5, 0.0, 0.20, 2.5, 15.0, 1),
+    "fedfunds": (4.0, 0.0, 0.30, 0.0, 20.0, 2),
+    "10y": (4.5, 0.0, 0.25, 0.5, 16.0, 2),
+}
+EXTRA_PROFILE = (100.0, 0.0, 1.0, 0.0, None, 2)       # indicators beyond the four above
+LOG_WALKS = {"cpi"}
+
+def indicator_names(series: int = len(PROFILES)) -> list:
+    # The panel's indicators first, then x5, x6, ... up to `series` per country
+    if series < len(panel.INDICATORS):
+        raise ValueError(f"series must be at least {len(panel.INDICATORS)} (the stress index inputs)")
+    return list(panel.INDICATORS) + [f"x{i + 1}" for i in range(len(panel.INDICATORS), series)]
+
+def registry(names: list, frequency: str = "mixed") -> dict:
+    # panel.monthly_panel registry covering the extra indicators (averaged when daily)
+    daily = frequency == "daily"
+    return {n: panel.INDICATORS.get(n, {"frequency": "daily" if daily else "monthly",
+                                        "agg": "mean" if daily else "last"})
+            for n in names}
+
+def dates(years: int, daily: bool) -> pd.DatetimeIndex:
+    end = pd.Timestamp(END_DATE)
+    start = end - pd.DateOffset(years=years)
+    return pd.bdate_range(start, end) if daily else pd.date_range(start, end, freq="MS")
+
+def walk(rng, name: str, countries: int, periods: int, per_month: float) -> np.ndarray:
+    # (countries, periods) array of one indicator for every country
+    level, drift, vol, floor, cap, decimals = PROFILES.get(name, EXTRA_PROFILE)
+    scale = 1 / per_month
+    start = level * rng.uniform(0.7, 1.3, size=(countries, 1))
+    steps = rng.normal(drift * scale, vol * np.sqrt(scale), size=(countries, periods))
+    if name in LOG_WALKS:
+        values = start * np.exp(np.cumsum(steps, axis=1))
+    else:
+        values = start + np.cumsum(steps, axis=1)
+    return np.round(np.clip(values, floor, cap), decimals)
+
+def generate(countries: int = 1, series: int = len(PROFILES), years: int = YEARS,
+             frequency: str = "mixed", seed: int = 0) -> dict:
+    # {(country, indicator): df with date/value columns}, as panel.to_long takes them
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"frequency must be one of {FREQUENCIES}")
+    rng = np.random.default_rng(seed)
+    names = indicator_names(series)
+    codes = [f"c{i:05d}" for i in range(countries)]
+
+    frames = {}
+    for name in names:
+        daily = frequency == "daily" or (frequency == "mixed" and panel.INDICATORS.get(name, {}).get("frequency") == "daily")
+        index = dates(years, daily)
+        values = walk(rng, name, countries, len(index), 21.0 if daily else 1.0)
+        for code, row in zip(codes, values):
+            frames[(code, name)] = pd.DataFrame({"date": index, "value": row})
+    return frames
+
+def size(frames: dict) -> int:
+    return sum(len(df) for df in frames.values())
@@ -1,8 +1,15 @@
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import Font, PatternFill
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
 import os
 
+import sql_store
+from instrumentation import instrument
+from storage import load_frame, load_optional
+
 DATA_PATH = "../data/processed/macro_us_with_risk.csv"
 SNAP_PATH = "../data/processed/sql_snapshot.csv"
 LAST12_PATH = "../data/processed/sql_last12.csv"
@@ -10,64 +17,126 @@ OUTPUT_FILE = "../reports/macro_us_report.xlsx"
 TOP_HIGH_PATH = "../data/processed/top_high_stress_periods.csv"
 TOP_LOW_PATH = "../data/processed/top_low_stress_periods.csv"
 INDEX_PATH = "../data/processed/macro_us_with_index.csv"
+SCENARIO_PATH = "../data/processed/scenario_cube.csv"
+
+# "stream" writes every sheet row by row in one pass (openpyxl write-only mode) with the risk
+# colours as native conditional formats; "pandas" is the original ExcelWriter + restyle pass
+EXCEL_WRITER = os.getenv("MACRO_EXCEL_WRITER", "stream")
+CHUNK_ROWS = 10_000
+MAX_SHEET_ROWS = 1_048_575   # Excel's row limit, less the header; longer frames continue on Sheet_2, ...
+
+# risk_level -> (fill colour, font colour)
+RISK_COLORS = {
+    "HIGH RISK": ("FF0000", "FFFFFF"),
+    "MEDIUM RISK": ("FFA500", None),
+    "LOW RISK": ("00B050", "FFFFFF"),
+}
+HEADER_FONT = Font(bold=True)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+HEADER_BORDER = Border(*(Side(style="thin"),) * 4)
 
 def style_overview(ws):
     # Highlight risk_level cell(s)
     for row in ws.iter_rows(min_row=2, max_row=2):
         for cell in row:
-            if cell.value == "HIGH RISK":
-                cell.fill = PatternFill(start_color="FF0000", fill_type="solid")
-                cell.font = Font(color="FFFFFF", bold=True)
-            elif cell.value == "MEDIUM RISK":
-                cell.fill = PatternFill(start_color="FFA500", fill_type="solid")
-                cell.font = Font(bold=True)
-            elif cell.value == "LOW RISK":
-                cell.fill = PatternFill(start_color="00B050", fill_type="solid")
-                cell.font = Font(color="FFFFFF", bold=True)
-
-def create_excel_report():
+            if cell.value in RISK_COLORS:
+                fill, color = RISK_COLORS[cell.value]
+                cell.fill = PatternFill(start_color=fill, fill_type="solid")
+                cell.font = Font(color=color, bold=True)
+
+def risk_rules(ws, col: int, rows: int) -> None:
+    # The style_overview colours as conditional formats over a whole risk_level column
+    cells = f"{get_column_letter(col)}2:{get_column_letter(col)}{rows + 1}"
+    for level, (fill, color) in RISK_COLORS.items():
+        ws.conditional_formatting.add(cells, CellIsRule(
+            operator="equal", formula=[f'"{level}"'],
+            fill=PatternFill(start_color=fill, end_color=fill, fill_type="solid"),
+            font=Font(color=color, bold=True)))
+
+def row_chunks(df: pd.DataFrame, size: int = CHUNK_ROWS):
+    # Rows as lists of Python values (NaN/NaT -> empty cell), converted a chunk at a time
+    for start in range(0, len(df), size):
+        chunk = df.iloc[start:start + size]
+        yield chunk.astype(object).where(chunk.notna(), None).to_numpy().tolist()
+
+def write_sheet(wb: Workbook, name: str, df: pd.DataFrame) -> None:
+    parts = range(0, max(len(df), 1), MAX_SHEET_ROWS)
+    for n, start in enumerate(parts):
+        part = df.iloc[start:start + MAX_SHEET_ROWS]
+        ws = wb.create_sheet(name if n == 0 else f"{name}_{n + 1}")
+        header = []
+        for c in part.columns:
+            cell = WriteOnlyCell(ws, value=str(c))
+            cell.font, cell.alignment, cell.border = HEADER_FONT, HEADER_ALIGNMENT, HEADER_BORDER
+            header.append(cell)
+        ws.append(header)
+        if "risk_level" in part.columns and len(part):
+            risk_rules(ws, part.columns.get_loc("risk_level") + 1, len(part))
+        for rows in row_chunks(part):
+            for row in rows:
+                ws.append(row)
+
+def write_streaming(sheets: dict, path: str = OUTPUT_FILE) -> None:
+    # Single pass: rows go straight to the sheet XML (constant memory per sheet), styling included
+    wb = Workbook(write_only=True)
+    for name, frame in sheets.items():
+        write_sheet(wb, name, frame)
+    wb.save(path)
+
+def write_pandas(sheets: dict, path: str = OUTPUT_FILE) -> None:
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for name, frame in sheets.items():
+            frame.to_excel(writer, sheet_name=name, index=False)
+
+    wb = load_workbook(path)
+    style_overview(wb["Overview"])
+    wb.save(path)
+
+WRITERS = {
+    "stream": write_streaming,
+    "pandas": write_pandas,
+}
+
+@instrument()
+def create_excel_report(df=None, index_df=None, top_high=None, top_low=None, snap=None, last12=None, scenarios=None):
+    # Frames passed in by the pipeline are used as-is; anything missing is loaded from disk
     os.makedirs("../reports", exist_ok=True)
 
-    df = pd.read_csv(DATA_PATH)
-    df["date"] = pd.to_datetime(df["date"])
+    # Standalone runs read the SQLite store first, then the processed files
+    if df is None:
+        df = sql_store.load_table("macro_risk")
+        df = load_frame(DATA_PATH) if df is None else df
     latest = df.sort_values("date").iloc[-1:]
     # Optional new insight tabs
-    top_high = pd.read_csv(TOP_HIGH_PATH) if os.path.exists(TOP_HIGH_PATH) else None
-    top_low = pd.read_csv(TOP_LOW_PATH) if os.path.exists(TOP_LOW_PATH) else None
-    index_df = pd.read_csv(INDEX_PATH) if os.path.exists(INDEX_PATH) else None
+    top_high = load_optional(TOP_HIGH_PATH) if top_high is None else top_high
+    top_low = load_optional(TOP_LOW_PATH) if top_low is None else top_low
+    if index_df is None:
+        index_df = sql_store.load_table("macro_index")
+        index_df = load_optional(INDEX_PATH) if index_df is None else index_df
 
     current_regime = None
     if index_df is not None:
-        index_df["date"] = pd.to_datetime(index_df["date"])
         current_regime = index_df.sort_values("date").iloc[-1:][
             ["date","macro_stress_index","stress_level","macro_strategy"]
         ]
 
     # Optional SQL tabs
-    snap = pd.read_csv(SNAP_PATH) if os.path.exists(SNAP_PATH) else None
-    last12 = pd.read_csv(LAST12_PATH) if os.path.exists(LAST12_PATH) else None
-
-    with pd.ExcelWriter(OUTPUT_FILE, engine="openpyxl") as writer:
-        latest.to_excel(writer, sheet_name="Overview", index=False)
-        df.to_excel(writer, sheet_name="Full_Data", index=False)
+    snap = load_optional(SNAP_PATH) if snap is None else snap
+    last12 = load_optional(LAST12_PATH) if last12 is None else last12
+    scenarios = load_optional(SCENARIO_PATH) if scenarios is None else scenarios
 
-        if snap is not None:
-            snap.to_excel(writer, sheet_name="SQL_Snapshot", index=False)
-        if last12 is not None:
-            last12.to_excel(writer, sheet_name="SQL_Last12", index=False)
-        if current_regime is not None:
-            current_regime.to_excel(writer, sheet_name="Current_Regime", index=False)
-
-        if top_high is not None:
-            top_high.to_excel(writer, sheet_name="Top_High_Stress", index=False)
-
-        if top_low is not None:
-            top_low.to_excel(writer, sheet_name="Top_Low_Stress", index=False)
-        
-
-    wb = load_workbook(OUTPUT_FILE)
-    style_overview(wb["Overview"])
-    wb.save(OUTPUT_FILE)
+    # Sheet order as in the report; optional tabs only when their data exists
+    sheets = {
+        "Overview": latest,
+        "Full_Data": df,
+        "SQL_Snapshot": snap,
+        "SQL_Last12": last12,
+        "Current_Regime": current_regime,
+        "Top_High_Stress": top_high,
+        "Top_Low_Stress": top_low,
+        "Scenarios": scenarios,
+    }
+    WRITERS[EXCEL_WRITER]({name: frame for name, frame in sheets.items() if frame is not None})
 
     print("✅ Excel Report Generated:", OUTPUT_FILE)
 
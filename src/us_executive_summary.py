@@ -1,4 +1,4 @@
-import pandas as pd
+from storage import load_frame
 
 DATA_PATH = "../data/processed/macro_us_with_risk.csv"
 
@@ -37,8 +37,7 @@ Strategic Considerations:
 
 
 if __name__ == "__main__":
-    df = pd.read_csv(DATA_PATH)
-    df["date"] = pd.to_datetime(df["date"])
+    df = load_frame(DATA_PATH)
     latest = df.sort_values("date").iloc[-1]
 
     summary = generate_summary(latest)
@@ -1,16 +1,44 @@
 import os
+
+import numpy as np
 import pandas as pd
 
+from feature_state import FeatureState, StateMismatch
+from instrumentation import instrument
+from storage import load_frame, load_optional, save_frame
+
 RAW_PATH = "../data/raw"
 OUT_PATH = "../data/processed"
+FEATURE_COLS = ["us_cpi", "us_unrate", "us_fedfunds", "us_10y"]
 
-def read_series(name: str) -> pd.DataFrame:
-    df = pd.read_csv(f"{RAW_PATH}/{name}.csv")
-    df["date"] = pd.to_datetime(df["date"])
+# Series that make up the monthly panel, in column order. Each is reduced to month-start
+# frequency with its own aggregation; adding an indicator is one entry here.
+MONTHLY_SERIES = {
+    # CPI, UNRATE, FEDFUNDS already monthly -> just align to month start
+    "us_cpi": {"frequency": "monthly", "agg": "last"},
+    "us_unrate": {"frequency": "monthly", "agg": "last"},
+    "us_fedfunds": {"frequency": "monthly", "agg": "last"},
+    # DGS10 is daily -> use monthly mean (more stable)
+    "us_10y": {"frequency": "daily", "agg": "mean"},
+}
+AGGREGATIONS = ("last", "first", "mean", "median", "sum", "min", "max")
+
+# "batch" recomputes every feature; "incremental" appends from the saved feature state
+BUILD_MODE = os.getenv("MACRO_BUILD_MODE", "batch")
+FEATURE_STATE_PATH = f"{OUT_PATH}/macro_us_feature_state.json"
+# Trailing months that are recomputed on every incremental run (the current month's
+# DGS10 average keeps moving until the month closes)
+REPLAY_MONTHS = int(os.getenv("MACRO_REPLAY_MONTHS", "2"))
+
+def prepare_series(df: pd.DataFrame, name: str) -> pd.DataFrame:
     df = df.sort_values("date").reset_index(drop=True)
     df = df.rename(columns={"value": name})
     return df
 
+def read_series(name: str) -> pd.DataFrame:
+    return prepare_series(load_frame(f"{RAW_PATH}/{name}.csv"), name)
+
+@instrument()
 def to_monthly(df: pd.DataFrame, col: str, how: str = "last") -> pd.DataFrame:
     # Convert to monthly frequency
     df = df.set_index("date")
@@ -22,6 +50,45 @@ def to_monthly(df: pd.DataFrame, col: str, how: str = "last") -> pd.DataFrame:
         raise ValueError("how must be 'last' or 'mean'")
     return m.reset_index()
 
+@instrument()
+def align_monthly(frames: dict, registry: dict = MONTHLY_SERIES) -> pd.DataFrame:
+    # Reduce every series to month-start frequency and align them on one monthly index.
+    # frames: {name: prepared df with date + name columns}. Series sharing an aggregation are
+    # stacked into one long (series, month, value) array and reduced by a single groupby, and
+    # the groups are joined in one concat; the result covers the months where every series'
+    # history overlaps (what chained inner merges of the resampled series gave).
+    names = list(registry)
+    dtype = frames[names[0]]["date"].dtype  # keep the input's datetime resolution
+    months = {n: frames[n]["date"].to_numpy().astype("datetime64[M]") for n in names}
+    if any(len(m) == 0 for m in months.values()):
+        return pd.DataFrame({"date": pd.DatetimeIndex([], dtype=dtype), **{n: pd.Series(dtype=float) for n in names}})
+    start = max(m.min() for m in months.values())
+    end = min(m.max() for m in months.values())
+    index = pd.DatetimeIndex(np.arange(start, end + 1).astype(dtype), name="date")
+
+    by_agg = {}
+    for n in names:
+        agg = registry[n]["agg"]
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"{n}: agg must be one of {AGGREGATIONS}")
+        by_agg.setdefault(agg, []).append(n)
+
+    blocks = []
+    for agg, group in by_agg.items():
+        sizes = [len(months[n]) for n in group]
+        long = pd.DataFrame({
+            "series": np.repeat(np.arange(len(group)), sizes),
+            "date": np.concatenate([months[n] for n in group]).astype(dtype),
+            "value": np.concatenate([frames[n][n].to_numpy(dtype=float) for n in group]),
+        })
+        wide = long.groupby(["series", "date"], sort=True)["value"].agg(agg).unstack("series")
+        wide.columns = [group[i] for i in wide.columns]
+        blocks.append(wide.reindex(index))
+
+    df = pd.concat(blocks, axis=1)[names]
+    return df.rename_axis("date").reset_index()
+
+@instrument()
 def add_features(df: pd.DataFrame, col: str) -> pd.DataFrame:
     # MoM and YoY percentage change + rolling averages
     df[f"{col}_mom_pct"] = df[col].pct_change(1) * 100
@@ -30,36 +97,63 @@ def add_features(df: pd.DataFrame, col: str) -> pd.DataFrame:
     df[f"{col}_roll6"] = df[col].rolling(6).mean()
     return df
 
-if __name__ == "__main__":
-    os.makedirs(OUT_PATH, exist_ok=True)
+def base_panel(frames: dict = None) -> pd.DataFrame:
+    # Aligned monthly levels, before features.
+    # frames: raw {name: df} as fetched by fred_multi; read from RAW_PATH when not given
+    def series(name):
+        return prepare_series(frames[name], name) if frames is not None else read_series(name)
 
-    cpi = read_series("us_cpi")
-    unrate = read_series("us_unrate")
-    fed = read_series("us_fedfunds")
-    dgs10 = read_series("us_10y")
+    return align_monthly({name: series(name) for name in MONTHLY_SERIES})
 
-    # Monthly standardization:
-    # CPI, UNRATE, FEDFUNDS already monthly -> just align to month start
-    cpi_m = to_monthly(cpi, "us_cpi", how="last")
-    unrate_m = to_monthly(unrate, "us_unrate", how="last")
-    fed_m = to_monthly(fed, "us_fedfunds", how="last")
-
-    # DGS10 is daily -> use monthly mean (more stable) OR last (choose mean)
-    dgs10_m = to_monthly(dgs10, "us_10y", how="mean")
-
-    # Merge all on date
-    df = cpi_m.merge(unrate_m, on="date", how="inner") \
-              .merge(fed_m, on="date", how="inner") \
-              .merge(dgs10_m, on="date", how="inner") \
-              .sort_values("date")
+@instrument()
+def build_dataset(frames: dict = None) -> pd.DataFrame:
+    df = base_panel(frames)
 
     # Add feature columns
-    for col in ["us_cpi", "us_unrate", "us_fedfunds", "us_10y"]:
+    for col in FEATURE_COLS:
         df = add_features(df, col)
+    return df
+
+def build_dataset_incremental(frames: dict = None, previous: pd.DataFrame = None, state: FeatureState = None):
+    # Same output as build_dataset, but only the months after the state's checkpoint get
+    # their features computed. Falls back to a full pass when there is no usable state.
+    # Returns (df, state).
+    base = base_panel(frames).reset_index(drop=True)
+
+    if previous is not None and state is not None:
+        try:
+            cut = state.checkpoint
+            rows = state.pending_rows(base)
+            fresh = pd.concat([rows, state.advance(rows, REPLAY_MONTHS)], axis=1)
+            kept = previous[previous["date"] <= cut] if cut is not None else previous.iloc[:0]
+            # The state only remembers the last few months; any older revision needs a full pass
+            frozen = base[base["date"] <= cut] if cut is not None else base.iloc[:0]
+            if not frozen.reset_index(drop=True).equals(kept[list(base.columns)].reset_index(drop=True)):
+                raise StateMismatch("levels before the checkpoint were revised")
+            df = pd.concat([kept, fresh], ignore_index=True)
+            print(f"✅ Incremental build: {len(rows)} month(s) recomputed from {cut.date() if cut is not None else 'start'}")
+            return df, state
+        except StateMismatch as e:
+            print(f"⚠ Feature state out of date ({e}); rebuilding all features")
+
+    state = FeatureState(FEATURE_COLS)
+    df = pd.concat([base, state.advance(base, REPLAY_MONTHS)], axis=1)
+    return df, state
+
+def build_incremental_from_disk(frames: dict = None) -> pd.DataFrame:
+    previous = load_optional(f"{OUT_PATH}/macro_us_monthly.csv")
+    df, state = build_dataset_incremental(frames, previous, FeatureState.load(FEATURE_STATE_PATH))
+    state.save(FEATURE_STATE_PATH)
+    return df
+
+def save_dataset(df: pd.DataFrame) -> str:
+    return save_frame(df, f"{OUT_PATH}/macro_us_monthly.csv")
+
+if __name__ == "__main__":
+    df = build_incremental_from_disk() if BUILD_MODE == "incremental" else build_dataset()
 
     # Save processed
-    out_file = f"{OUT_PATH}/macro_us_monthly.csv"
-    df.to_csv(out_file, index=False)
+    out_file = save_dataset(df)
 
     print("✅ Built dataset:", out_file)
     print("Rows:", len(df), "| Columns:", len(df.columns))
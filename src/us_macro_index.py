@@ -1,14 +1,129 @@
-import pandas as pd
 import os
-import matplotlib.pyplot as plt
+import pandas as pd
 import numpy as np
 
+from instrumentation import instrument
+from storage import load_frame, save_frame
+
 DATA_PATH = "../data/processed/macro_us_with_risk.csv"
 OUT_PATH = "../data/processed"
 
+FORECAST_PERIODS = 3
+FORECAST_WINDOW = 24
+
+# Component normalization: "full" uses the whole sample's mean/std (history moves as data
+# arrives); "expanding" and "rolling" only use months up to each date, so there is no look-ahead
+ZSCORE_MODE = os.getenv("MACRO_ZSCORE_MODE", "full")
+ZSCORE_WINDOW = int(os.getenv("MACRO_ZSCORE_WINDOW", "120"))  # months, rolling mode
+ZSCORE_MIN_PERIODS = int(os.getenv("MACRO_ZSCORE_MIN_PERIODS", "24"))
+ZSCORE_MODES = ("full", "expanding", "rolling")
+
+# z column -> input column; the stress index is their sum
+STRESS_COMPONENTS = {
+    "z_cpi": "us_cpi_yoy_pct",
+    "z_unrate": "us_unrate",
+    "z_fedfunds": "us_fedfunds",
+    "z_10y": "us_10y",
+}
+
+# Stress index cut-offs, highest first (below the last one: VERY LOW)
+INDEX_LEVELS = [(2, "CRITICAL"), (1, "ELEVATED"), (0, "MODERATE"), (-1, "LOW")]
+REGIME_STRATEGIES = {
+    "VERY LOW": "Pro-Growth regime: Favor Equities, Tech, Small Caps",
+    "LOW": "Stable regime: Maintain balanced equity exposure",
+    "MODERATE": "Rising stress: Rotate into Quality sectors",
+    "ELEVATED": "Tightening: Consider Utilities, Value",
+    "CRITICAL": "Defensive: Increase Cash, Bonds, Gold"
+}
+
+@instrument()
 def z_score(series):
     return (series - series.mean()) / series.std()
 
+class ZScoreState:
+    # Streaming mean/variance (Welford) for K components at once. In rolling mode the last
+    # `window` rows are kept and removed again with the inverse update. NaNs are skipped per
+    # component. Rows are pushed in date order; the state can be saved and resumed.
+    def __init__(self, k: int, mode: str = "expanding", window: int = ZSCORE_WINDOW,
+                 min_periods: int = ZSCORE_MIN_PERIODS, state: dict = None):
+        if mode not in ("expanding", "rolling"):
+            raise ValueError("ZScoreState mode must be 'expanding' or 'rolling'")
+        s = state or {}
+        self.k, self.mode, self.window, self.min_periods = k, mode, window, max(2, min_periods)
+        self.n = np.array(s.get("n", np.zeros(k)), dtype=float)
+        self.mean = np.array(s.get("mean", np.zeros(k)), dtype=float)
+        self.m2 = np.array(s.get("m2", np.zeros(k)), dtype=float)
+        self.buffer = [np.array(row, dtype=float) for row in s.get("buffer", [])]
+        self.checkpoint = pd.Timestamp(s["checkpoint"]) if s.get("checkpoint") else None
+
+    def to_dict(self) -> dict:
+        nan_to_none = lambda a: [None if v != v else v for v in a]
+        return {"mode": self.mode, "window": self.window, "min_periods": self.min_periods,
+                "n": self.n.tolist(), "mean": self.mean.tolist(), "m2": self.m2.tolist(),
+                "buffer": [nan_to_none(r.tolist()) for r in self.buffer],
+                "checkpoint": str(self.checkpoint.date()) if self.checkpoint is not None else None}
+
+    @classmethod
+    def from_dict(cls, k: int, d: dict):
+        d = dict(d, buffer=[[np.nan if v is None else v for v in r] for r in d.get("buffer", [])])
+        return cls(k, d["mode"], d["window"], d["min_periods"], d)
+
+    def _add(self, x: np.ndarray) -> None:
+        ok = ~np.isnan(x)
+        self.n[ok] += 1
+        delta = np.where(ok, x - self.mean, 0.0)
+        self.mean += np.divide(delta, self.n, out=np.zeros(self.k), where=ok)
+        self.m2 += np.where(ok, delta * (x - self.mean), 0.0)
+
+    def _remove(self, x: np.ndarray) -> None:
+        ok = ~np.isnan(x)
+        self.n[ok] -= 1
+        empty = ok & (self.n == 0)
+        delta = np.where(ok, x - self.mean, 0.0)
+        self.mean -= np.divide(delta, self.n, out=np.zeros(self.k), where=ok & ~empty)
+        self.m2 -= np.where(ok, delta * (x - self.mean), 0.0)
+        self.mean[empty], self.m2[empty] = 0.0, 0.0
+        np.maximum(self.m2, 0.0, out=self.m2)  # rounding can push a tiny M2 below zero
+
+    def push(self, x) -> np.ndarray:
+        # z of row x against the window ending at (and including) x
+        x = np.asarray(x, dtype=float)
+        self._add(x)
+        if self.mode == "rolling":
+            self.buffer.append(x)
+            if len(self.buffer) > self.window:
+                self._remove(self.buffer.pop(0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            std = np.sqrt(self.m2 / (self.n - 1))
+            z = (x - self.mean) / std
+        z[self.n < self.min_periods] = np.nan
+        return z
+
+    def update(self, values: np.ndarray, dates=None) -> np.ndarray:
+        # (T x K) values -> (T x K) z-scores; with dates, rows at or before the checkpoint
+        # (already pushed) are skipped and come back as NaN
+        values = np.asarray(values, dtype=float).reshape(-1, self.k)
+        out = np.full(values.shape, np.nan)
+        start = 0
+        if dates is not None:
+            dates = pd.DatetimeIndex(dates)
+            if self.checkpoint is not None:
+                start = int(dates.searchsorted(self.checkpoint, side="right"))
+        for t in range(start, len(values)):
+            out[t] = self.push(values[t])
+        if dates is not None and len(values) > start:
+            self.checkpoint = dates[-1]
+        return out
+
+def component_zscores(values: np.ndarray, mode: str = ZSCORE_MODE, window: int = ZSCORE_WINDOW,
+                      min_periods: int = ZSCORE_MIN_PERIODS) -> np.ndarray:
+    # (T x K) component values -> (T x K) z-scores under the given normalization mode
+    if mode not in ZSCORE_MODES:
+        raise ValueError(f"z-score mode must be one of {ZSCORE_MODES}")
+    if mode == "full":
+        return np.column_stack([z_score(pd.Series(v)).to_numpy() for v in np.asarray(values, dtype=float).T])
+    return ZScoreState(values.shape[1], mode, window, min_periods).update(values)
+
 def classify_index(value):
     if value >= 2:
         return "CRITICAL"
@@ -21,15 +136,27 @@ def classify_index(value):
     else:
         return "VERY LOW"
 
-if __name__ == "__main__":
-    df = pd.read_csv(DATA_PATH)
-    df["date"] = pd.to_datetime(df["date"])
+def classify_index_values(values) -> np.ndarray:
+    # Vectorized classify_index over an array of (non-NaN) index values
+    values = np.asarray(values, dtype=float)
+    return np.select([values >= cut for cut, _ in INDEX_LEVELS],
+                     [name for _, name in INDEX_LEVELS], "VERY LOW").astype(object)
+
+def regime_strategy(level):
+    return REGIME_STRATEGIES.get(level, "No strategy")
+
+@instrument()
+def build_index(df: pd.DataFrame, mode: str = ZSCORE_MODE, window: int = ZSCORE_WINDOW) -> pd.DataFrame:
+    df = df.copy()
 
     # Create Z-scores
-    df["z_cpi"] = z_score(df["us_cpi_yoy_pct"])
-    df["z_unrate"] = z_score(df["us_unrate"])
-    df["z_fedfunds"] = z_score(df["us_fedfunds"])
-    df["z_10y"] = z_score(df["us_10y"])
+    if mode == "full":
+        for z, col in STRESS_COMPONENTS.items():
+            df[z] = z_score(df[col])
+    else:
+        df = df.sort_values("date")
+        values = df[list(STRESS_COMPONENTS.values())].to_numpy(dtype=float)
+        df[list(STRESS_COMPONENTS)] = component_zscores(values, mode, window)
 
     # Composite index
     df["macro_stress_index"] = (
@@ -43,123 +170,73 @@ if __name__ == "__main__":
     df = df.dropna(subset=["macro_stress_index"])
 
     df["stress_level"] = df["macro_stress_index"].apply(classify_index)
+    df["macro_strategy"] = df["stress_level"].apply(regime_strategy)
+    return df
 
-    def regime_strategy(level):
-        mapping = {
-            "VERY LOW": "Pro-Growth regime: Favor Equities, Tech, Small Caps",
-            "LOW": "Stable regime: Maintain balanced equity exposure",
-            "MODERATE": "Rising stress: Rotate into Quality sectors",
-            "ELEVATED": "Tightening: Consider Utilities, Value",
-            "CRITICAL": "Defensive: Increase Cash, Bonds, Gold"
-        }
-        return mapping.get(level, "No strategy")
+def top_periods(df: pd.DataFrame, n: int = 10):
+    # Partial selection instead of sorting the whole history
+    top_high = df.nlargest(n, "macro_stress_index")
+    top_low = df.nsmallest(n, "macro_stress_index")
+    return top_high, top_low
 
-    df["macro_strategy"] = df["stress_level"].apply(regime_strategy)
+def forecast_index(df: pd.DataFrame, periods: int = FORECAST_PERIODS, window: int = FORECAST_WINDOW) -> pd.DataFrame:
+    # Linear trend over the last `window` months, extrapolated `periods` months ahead
+    df = df.sort_values("date")
 
-    top_high = df.sort_values("macro_stress_index", ascending=False).head(10)
-    top_low = df.sort_values("macro_stress_index").head(10)
+    recent = df.tail(window).copy()
+    recent["t"] = np.arange(len(recent))
 
-    top_high.to_csv("../data/processed/top_high_stress_periods.csv", index=False)
-    top_low.to_csv("../data/processed/top_low_stress_periods.csv", index=False)
+    slope, intercept = np.polyfit(recent["t"], recent["macro_stress_index"], 1)
 
-    print("✅ Top risk periods saved.")
+    future_t = np.arange(len(recent), len(recent) + periods)
+    forecast_values = intercept + slope * future_t
+
+    last_date = df["date"].max()
+    future_dates = pd.date_range(
+        last_date + pd.offsets.MonthBegin(1),
+        periods=periods,
+        freq="MS"
+    )
+
+    return pd.DataFrame({
+        "date": future_dates,
+        "macro_stress_index": forecast_values
+    })
 
-    os.makedirs(OUT_PATH, exist_ok=True)
-    df.to_csv(f"{OUT_PATH}/macro_us_with_index.csv", index=False)
+def save_index(df, top_high, top_low):
+    save_frame(top_high, f"{OUT_PATH}/top_high_stress_periods.csv")
+    save_frame(top_low, f"{OUT_PATH}/top_low_stress_periods.csv")
+    save_frame(df, f"{OUT_PATH}/macro_us_with_index.csv")
 
+def save_forecast(forecast_df):
+    # Save forecast (useful for PDF/Excel)
+    save_frame(forecast_df, f"{OUT_PATH}/macro_us_index_forecast.csv")
+
+if __name__ == "__main__":
+    df = build_index(load_frame(DATA_PATH))
+    top_high, top_low = top_periods(df)
+    save_index(df, top_high, top_low)
+
+    print("✅ Top risk periods saved.")
     print("✅ Macro Financial Stress Index Created")
     print(df[["date", "macro_stress_index", "stress_level"]].tail())
 
-# --- Forecast + Plot ---
-forecast_periods = 3
-window = 24
-
-df = df.sort_values("date")
-
-recent = df.tail(window).copy()
-recent["t"] = np.arange(len(recent))
-
-# Linear regression (trend)
-slope, intercept = np.polyfit(recent["t"], recent["macro_stress_index"], 1)
-
-future_t = np.arange(len(recent), len(recent) + forecast_periods)
-forecast_values = intercept + slope * future_t
-
-last_date = df["date"].max()
-future_dates = pd.date_range(
-    last_date + pd.offsets.MonthBegin(1),
-    periods=forecast_periods,
-    freq="MS"
-)
-
-forecast_df = pd.DataFrame({
-    "date": future_dates,
-    "macro_stress_index": forecast_values
-})
-
-# Save forecast to CSV (useful for PDF/Excel)
-forecast_df.to_csv("../data/processed/macro_us_index_forecast.csv", index=False)
-
-plt.figure(figsize=(10, 5))
-plt.plot(df["date"], df["macro_stress_index"], label="Historical")
-plt.plot(
-    forecast_df["date"],
-    forecast_df["macro_stress_index"],
-    linestyle="--",
-    label="Forecast (3m)"
-)
-plt.legend()
-plt.title("Macro Financial Stress Index (US) + Forecast")
-plt.xlabel("Date")
-plt.ylabel("Stress Index")
-plt.tight_layout()
-plt.savefig("../reports/macro_stress_index.png")
-
-print("✅ Chart with forecast saved to reports/macro_stress_index.png")
-# Linear regression
-coeffs = np.polyfit(recent["t"], recent["macro_stress_index"], 1)
-slope, intercept = coeffs
-
-future_t = np.arange(len(recent), len(recent) + forecast_periods)
-forecast_values = intercept + slope * future_t
-
-last_date = df["date"].max()
-future_dates = pd.date_range(
-    last_date + pd.offsets.MonthBegin(1),
-    periods=forecast_periods,
-    freq="MS"
-)
-
-forecast_df = pd.DataFrame({
-    "date": future_dates,
-    "macro_stress_index": forecast_values
-})
-
-# Plot 1: Full history
-plt.figure(figsize=(10, 5))
-plt.plot(df["date"], df["macro_stress_index"], label="Historical")
-plt.plot(forecast_df["date"], forecast_df["macro_stress_index"], linestyle="--", label="Forecast (3m)")
-plt.legend()
-plt.title("Macro Financial Stress Index (US) + Forecast (Full History)")
-plt.xlabel("Date")
-plt.ylabel("Stress Index")
-plt.tight_layout()
-plt.savefig("../reports/macro_stress_index_full.png")
-
-# Plot 2: Recent zoom (last 15 years)
-cutoff = df["date"].max() - pd.DateOffset(years=15)
-recent_df = df[df["date"] >= cutoff]
-
-plt.figure(figsize=(10, 5))
-plt.plot(recent_df["date"], recent_df["macro_stress_index"], label="Historical (Last 15y)")
-plt.plot(forecast_df["date"], forecast_df["macro_stress_index"], linestyle="--", marker="o", label="Forecast (3m)")
-plt.legend()
-plt.title("Macro Financial Stress Index (US) + Forecast (Last 15 Years)")
-plt.xlabel("Date")
-plt.ylabel("Stress Index")
-plt.tight_layout()
-plt.savefig("../reports/macro_stress_index_recent.png")
-
-print("✅ Charts saved:")
-print(" - reports/macro_stress_index_full.png")
-print(" - reports/macro_stress_index_recent.png")
+    # --- Forecast + Plot ---
+    from stress_forecast import forecast
+    forecast_df = forecast(df)
+    save_forecast(forecast_df)
+
+    # The reports read the index, forecast and stress ranks from SQLite first; keep them in step
+    # with the files when this runs on its own (cli.py index, PIPELINE_MODE=subprocess)
+    import macro_summary
+    import sql_store
+    for result in (sql_store.store_index(df), sql_store.store_forecast(forecast_df)):
+        macro_summary.refresh(result)
+        print(f"✅ SQLite {result['table']}: {result['written']} row(s) written, {result['deleted']} deleted")
+    from chart_renderer import render_index_charts
+    render_index_charts(df, forecast_df)
+
+    print("✅ Charts saved:")
+    print(" - reports/macro_stress_index.png")
+    print(" - reports/macro_stress_index_full.png")
+    print(" - reports/macro_stress_index_recent.png")
@@ -4,6 +4,11 @@ from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
 
+import macro_summary
+import sql_store
+from instrumentation import instrument
+from storage import load_frame, load_optional
+
 DATA_PATH = "../data/processed/macro_us_with_index.csv"
 FORECAST_PATH = "../data/processed/macro_us_index_forecast.csv"
 TOP_HIGH_PATH = "../data/processed/top_high_stress_periods.csv"
@@ -21,81 +26,114 @@ def percentile_rank(series, value):
     # percent of values below current
     return (series < value).mean() * 100
 
-def make_pdf():
-    os.makedirs("../reports", exist_ok=True)
-
-    df = pd.read_csv(DATA_PATH)
-    df["date"] = pd.to_datetime(df["date"])
-    df = df.dropna(subset=["macro_stress_index"]).sort_values("date")
-
+# Page template shared by make_pdf and pdf_batch: (font, size, cm from the top, text). Text is
+# filled from the brief's fields; a line whose fields are missing (e.g. no forecast band) is left out.
+LAYOUT = [
+    ("Helvetica-Bold", 16, 2.0, "MACROECONOMIC RISK BRIEF ({entity})"),
+    ("Helvetica", 11, 3.0, "Report Date: {date}"),
+    ("Helvetica", 11, 3.7, "Macro Stress Index: {index:.2f}"),
+    ("Helvetica", 11, 4.4, "Stress Level: {stress_level}"),
+    ("Helvetica", 11, 5.1, "Historical Percentile: {pct:.0f}th (higher = more stress)"),
+    ("Helvetica", 11, 5.8, "{forecast_months}-Month Forecast Trend: {forecast_trend} (Δ {forecast_delta:+.2f})"),
+    ("Helvetica", 11, 6.5, "{forecast_months}-Month Range (5-95%): {band_low:.2f} to {band_high:.2f}"),
+    ("Helvetica-Bold", 12, 7.2, "Regime-Based Strategy:"),
+    ("Helvetica", 11, 7.9, "- {macro_strategy}"),
+    ("Helvetica-Bold", 12, 9.2, "Historical Context (Top 3 Stress Months):"),
+]
+TOP3_Y, TOP3_STEP = 9.9, 0.6
+FOOTER = "Generated automatically via Python pipeline (FRED macro series + composite index)."
+
+def brief_fields(df: pd.DataFrame, fc=None, top=None, pct=None, entity: str = "US") -> dict:
+    # Everything a brief prints, from one entity's index history (sorted, no missing index),
+    # its forecast and its top stress months
     latest = df.iloc[-1]
     last_index = float(latest["macro_stress_index"])
-    stress_level = str(latest["stress_level"])
-    macro_strategy = str(latest.get("macro_strategy", "N/A"))
-
-    # Percentile
-    pct = percentile_rank(df["macro_stress_index"], last_index)
-
-    # Forecast
-    forecast_trend = "N/A"
-    forecast_delta = 0.0
-    if os.path.exists(FORECAST_PATH):
-        fc = pd.read_csv(FORECAST_PATH)
-        fc["date"] = pd.to_datetime(fc["date"])
-        if len(fc) >= 2:
-            forecast_delta = float(fc["macro_stress_index"].iloc[-1] - fc["macro_stress_index"].iloc[0])
-            forecast_trend = trend_label(forecast_delta)
-
-    # Top high stress context (top 3)
-    top3_text = []
-    if os.path.exists(TOP_HIGH_PATH):
-        top = pd.read_csv(TOP_HIGH_PATH)
-        top["date"] = pd.to_datetime(top["date"])
+    fields = {
+        "entity": entity,
+        "date": pd.to_datetime(latest["date"]).date(),
+        "index": last_index,
+        "stress_level": str(latest["stress_level"]),
+        "macro_strategy": str(latest.get("macro_strategy", "N/A")),
+        "pct": percentile_rank(df["macro_stress_index"], last_index) if pct is None else pct,
+        "forecast_trend": "N/A",
+        "forecast_delta": 0.0,
+        "forecast_months": 3,
+        "top3": [],
+    }
+
+    if fc is not None and len(fc) >= 2:
+        fields["forecast_months"] = len(fc)
+        fields["forecast_delta"] = float(fc["macro_stress_index"].iloc[-1] - fc["macro_stress_index"].iloc[0])
+        fields["forecast_trend"] = trend_label(fields["forecast_delta"])
+        if {"q05", "q95"} <= set(fc.columns):
+            fields["band_low"], fields["band_high"] = float(fc["q05"].iloc[-1]), float(fc["q95"].iloc[-1])
+
+    if top is not None:
         top = top.sort_values("macro_stress_index", ascending=False).head(3)
-        for _, r in top.iterrows():
-            top3_text.append(f"{r['date'].date()} (Index {float(r['macro_stress_index']):.2f})")
-
-    # Build PDF
-    c = canvas.Canvas(OUTPUT_FILE, pagesize=A4)
-    width, height = A4
+        fields["top3"] = [f"{pd.Timestamp(d).date()} (Index {float(v):.2f})"
+                          for d, v in zip(top["date"], top["macro_stress_index"])]
+    return fields
+
+def draw_brief(c: canvas.Canvas, fields: dict, chart=None) -> None:
+    # One page from LAYOUT; chart is an image path (or ImageReader) or None
+    height = A4[1]
+    font = None
+    for face, size, y, text in LAYOUT:
+        try:
+            line = text.format(**fields)
+        except KeyError:
+            continue
+        if (face, size) != font:
+            c.setFont(face, size)
+            font = (face, size)
+        c.drawString(2 * cm, height - y * cm, line)
 
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(2 * cm, height - 2 * cm, "MACROECONOMIC RISK BRIEF (US)")
-
-    c.setFont("Helvetica", 11)
-    c.drawString(2 * cm, height - 3 * cm, f"Report Date: {pd.to_datetime(latest['date']).date()}")
-    c.drawString(2 * cm, height - 3.7 * cm, f"Macro Stress Index: {last_index:.2f}")
-    c.drawString(2 * cm, height - 4.4 * cm, f"Stress Level: {stress_level}")
-    c.drawString(2 * cm, height - 5.1 * cm, f"Historical Percentile: {pct:.0f}th (higher = more stress)")
-    c.drawString(2 * cm, height - 5.8 * cm, f"3-Month Forecast Trend: {forecast_trend} (Δ {forecast_delta:+.2f})")
-
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(2 * cm, height - 7.2 * cm, "Regime-Based Strategy:")
     c.setFont("Helvetica", 11)
-    c.drawString(2 * cm, height - 7.9 * cm, f"- {macro_strategy}")
+    y = height - TOP3_Y * cm
+    for t in fields["top3"] or ["N/A"]:
+        c.drawString(2 * cm, y, f"- {t}")
+        y -= TOP3_STEP * cm
 
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(2 * cm, height - 9.2 * cm, "Historical Context (Top 3 Stress Months):")
-    c.setFont("Helvetica", 11)
-    y = height - 9.9 * cm
-    if top3_text:
-        for t in top3_text:
-            c.drawString(2 * cm, y, f"- {t}")
-            y -= 0.6 * cm
-    else:
-        c.drawString(2 * cm, y, "- N/A")
-
-    # Chart
-    if os.path.exists(CHART_PATH):
-        c.drawImage(CHART_PATH, 2 * cm, 2.0 * cm, width=16 * cm, preserveAspectRatio=True)
+    if chart is not None:
+        c.drawImage(chart, 2 * cm, 2.0 * cm, width=16 * cm, preserveAspectRatio=True)
 
     c.setFont("Helvetica-Oblique", 9)
-    c.drawString(2 * cm, 1.4 * cm, "Generated automatically via Python pipeline (FRED macro series + composite index).")
-
+    c.drawString(2 * cm, 1.4 * cm, FOOTER)
     c.showPage()
+
+@instrument()
+def make_pdf(df=None, fc=None, top=None):
+    # Frames passed in by the pipeline are used as-is; anything missing is loaded from disk
+    os.makedirs("../reports", exist_ok=True)
+
+    # Standalone runs read the SQLite store first, then the processed files
+    if df is None:
+        df = sql_store.load_table("macro_index")
+        df = load_frame(DATA_PATH) if df is None else df
+    df = df.dropna(subset=["macro_stress_index"]).sort_values("date")
+    latest = df.iloc[-1]
+
+    # Percentile: materialized by the store for the latest month, else computed in brief_fields
+    pct = None
+    summary = macro_summary.regime()
+    if summary is not None and pd.Timestamp(summary["date"]) == pd.Timestamp(latest["date"]) \
+            and summary["macro_stress_index"] == float(latest["macro_stress_index"]):
+        pct = float(summary["percentile"])
+
+    if fc is None:
+        fc = sql_store.load_table("macro_forecast")
+        fc = load_optional(FORECAST_PATH) if fc is None else fc
+
+    # Top high stress context (top 3)
+    if top is None:
+        top = macro_summary.top_stress(3) if sql_store.has_table("stress_rank") else None
+        top = load_optional(TOP_HIGH_PATH) if top is None else top
+
+    c = canvas.Canvas(OUTPUT_FILE, pagesize=A4)
+    draw_brief(c, brief_fields(df, fc, top, pct), CHART_PATH if os.path.exists(CHART_PATH) else None)
     c.save()
 
     print("✅ PDF upgraded with context & percentile:", OUTPUT_FILE)
 
 if __name__ == "__main__":
-    make_pdf()
\ No newline at end of file
+    make_pdf()
@@ -1,10 +1,14 @@
 import pandas as pd
-import os
+
+from instrumentation import instrument
+from risk_rules import CompiledRules, get_rules
+from storage import load_frame, save_frame
 
 DATA_PATH = "../data/processed/macro_us_monthly.csv"
 OUT_PATH = "../data/processed"
 
 def evaluate_risk(row):
+    # Row-wise reference for the default rules, kept for spot checks; score_risk is vectorized
     alerts = []
     score = 0
 
@@ -38,19 +42,33 @@ def classify_score(score):
     else:
         return "LOW RISK"
 
-if __name__ == "__main__":
-    df = pd.read_csv(DATA_PATH)
-    df["date"] = pd.to_datetime(df["date"])
+@instrument()
+def evaluate_risk_frame(df: pd.DataFrame, rules: CompiledRules = None):
+    # Vectorized evaluate_risk over the whole frame: returns (scores, alerts, levels) arrays
+    return (rules or get_rules()).evaluate(df)
+
+@instrument()
+def score_risk(df: pd.DataFrame, rules: CompiledRules = None) -> pd.DataFrame:
+    # rules defaults to config/risk_rules.json (see risk_rules.get_rules)
+    df = df.copy()
 
     # Apply risk logic
-    df[["risk_score", "alerts"]] = df.apply(evaluate_risk, axis=1)
-    df["risk_level"] = df["risk_score"].apply(classify_score)
+    scores, alerts, levels = evaluate_risk_frame(df, rules)
+    df["risk_score"] = scores
+    df["alerts"] = alerts
+    df["risk_level"] = levels
+    return df
+
+def save_risk(df: pd.DataFrame) -> str:
+    return save_frame(df, f"{OUT_PATH}/macro_us_with_risk.csv")
+
+if __name__ == "__main__":
+    df = score_risk(load_frame(DATA_PATH))
 
     # Keep only latest month for executive summary
     latest = df.sort_values("date").iloc[-1]
 
-    os.makedirs(OUT_PATH, exist_ok=True)
-    df.to_csv(f"{OUT_PATH}/macro_us_with_risk.csv", index=False)
+    save_risk(df)
 
     print("✅ Risk Engine Applied")
     print("\nLatest Month:")
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+import macro_summary
+import sql_store
+
+def store_stress(path, values):
+    df = pd.DataFrame({
+        "date": pd.date_range("2000-01-01", periods=len(values), freq="MS"),
+        "macro_stress_index": values,
+        "stress_level": "LOW",
+        "macro_strategy": "Neutral",
+    })
+    macro_summary.refresh(sql_store.store_index(df, path=path), path)
+    return df
+
+def test_percentile_with_tied_minimum(tmp_path):
+    path = str(tmp_path / "macro.db")
+    df = store_stress(path, [1.0, 1.0, 2.0])
+
+    stored = macro_summary.regime(path=path)["percentile"]
+    ranking = macro_summary.StressRanking(df["macro_stress_index"], df["date"])
+    assert macro_summary.percentile(2.0, path=path) == pytest.approx(stored)
+    assert macro_summary.percentile(2.0, path=path) == pytest.approx(ranking.percentile(2.0))
+    assert stored == pytest.approx(200 / 3)
+
+def test_percentile_with_ties_below(tmp_path):
+    path = str(tmp_path / "macro.db")
+    values = [3.0, 1.0, 2.0, 2.0, 2.0, 4.0]
+    df = store_stress(path, values)
+
+    ranking = macro_summary.StressRanking(df["macro_stress_index"], df["date"])
+    for value in (0.5, 1.0, 2.0, 2.5, 3.0, 5.0):
+        expected = (pd.Series(values) < value).mean() * 100
+        assert macro_summary.percentile(value, path=path) == pytest.approx(expected)
+        assert ranking.percentile(value) == pytest.approx(expected)
@@ -0,0 +1,35 @@
+import sqlite3
+
+import pandas as pd
+
+import sql_store
+
+def old_style_db(path):
+    # A database from before the store: macro_us written as a plain table by to_sql
+    conn = sqlite3.connect(path)
+    pd.DataFrame({"date": ["2000-01-01", "2000-02-01"], "risk_score": [1, 2]}).to_sql("macro_us", conn, index=False)
+    conn.close()
+
+def kind(path, name):
+    row = sql_store.get_connection(path).execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row and row[0]
+
+def test_store_index_keeps_legacy_macro_us(tmp_path):
+    path = str(tmp_path / "macro.db")
+    old_style_db(path)
+
+    index = pd.DataFrame({"date": pd.to_datetime(["2000-01-01", "2000-02-01"]), "macro_stress_index": [0.5, 1.5]})
+    sql_store.store_index(index, path=path)
+
+    assert kind(path, "macro_us") == "table"
+    assert len(sql_store.query("SELECT * FROM macro_us", path=path)) == 2
+
+def test_store_risk_replaces_legacy_macro_us_with_view(tmp_path):
+    path = str(tmp_path / "macro.db")
+    old_style_db(path)
+
+    risk = pd.DataFrame({"date": pd.to_datetime(["2000-01-01", "2000-02-01", "2000-03-01"]), "risk_score": [1, 2, 3]})
+    sql_store.store_risk(risk, path=path)
+
+    assert kind(path, "macro_us") == "view"
+    assert sql_store.query("SELECT risk_score FROM macro_us ORDER BY date", path=path)["risk_score"].tolist() == [1, 2, 3]